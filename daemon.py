@@ -0,0 +1,41 @@
+import os
+import sys
+import argparse
+import logging
+import signal
+
+from modules.settings import Settings
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Checks favourites for new chapters without the ui')
+    parser.add_argument('--once', action='store_true', help='check once and exit')
+    parser.add_argument('--interval', type=float, default=Settings.daemon_interval,
+                        help='seconds between checks (default %(default)s)')
+    parser.add_argument('--jitter', type=float, default=Settings.daemon_jitter,
+                        help='fraction of the interval every wait is randomly moved by (default %(default)s)')
+    parser.add_argument('--download', action='store_true', help='download new chapters of favourites')
+    parser.add_argument('--directory', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='directory holding config.json and Manga (default: next to this script)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    # paths in Settings are relative to the app directory
+    os.chdir(args.directory)
+
+    from modules.update_daemon import UpdateDaemon
+
+    daemon = UpdateDaemon(Settings(), args.interval, args.jitter, args.download)
+    if args.once:
+        daemon.check()
+        return 0
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop())
+    daemon.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -401,8 +401,12 @@ class Ui_MainWindow(object):
         self.compositingLabel.setWordWrap(True)
         self.compositingLabel.setObjectName("compositingLabel")
         self.verticalLayout_4.addWidget(self.compositingLabel)
-        spacerItem12 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
+        spacerItem12 = QtWidgets.QSpacerItem(0, 10, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Fixed)
         self.verticalLayout_4.addItem(spacerItem12)
+        self.downloadQueueListWidget = QtWidgets.QListWidget(self.widget_4)
+        self.downloadQueueListWidget.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.downloadQueueListWidget.setObjectName("downloadQueueListWidget")
+        self.verticalLayout_4.addWidget(self.downloadQueueListWidget)
         self.gridLayout_9.addLayout(self.verticalLayout_4, 0, 0, 1, 1)
         self.gridLayout_8.addWidget(self.widget_4, 0, 0, 1, 1)
         self.dynamicStack.addWidget(self.Download)
@@ -714,6 +718,7 @@ class Ui_MainWindow(object):
         self.pageDownloadProgressBar.setFormat(_translate("MainWindow", "%v of %m kb | %p%"))
         self.BackToChaptersPushButton.setText(_translate("MainWindow", "Chapter List"))
         self.progressOpenDirectoryButton.setToolTip(_translate("MainWindow", "Open the downloaded manga directory"))
+        self.downloadQueueListWidget.setToolTip(_translate("MainWindow", "Download queue, right click a job to manage it"))
         self.progressOpenDirectoryButton.setText(_translate("MainWindow", "Open directory"))
         self.previousPopularButton.setText(_translate("MainWindow", "Previous Page"))
         self.refreshPopularButton.setText(_translate("MainWindow", "Refresh"))
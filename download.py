@@ -0,0 +1,55 @@
+import os
+import sys
+import argparse
+import signal
+
+from modules.settings import Settings
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Downloads mangas without the ui, progress is printed as json lines')
+    parser.add_argument('urls', nargs='*', help='manga page urls')
+    parser.add_argument('-f', '--file', help='file with a manga url per line, - reads stdin')
+    parser.add_argument('-c', '--chapters',
+                        help="chapters to download by position, 1 is the oldest: '1-10,15,20-' (default: all)")
+    parser.add_argument('-o', '--output', default=Settings.manga_save_path,
+                        help='directory mangas are saved to (default %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=Settings.concurrent_jobs,
+                        help='mangas downloaded at once (default %(default)s)')
+    parser.add_argument('-w', '--workers', type=int, default=Settings.page_download_workers,
+                        help='pages downloaded at once per manga (default %(default)s)')
+    parser.add_argument('--jpg', action='store_true', help='composite chapters into jpg')
+    parser.add_argument('--pdf', action='store_true', help='composite chapters into pdf')
+    parser.add_argument('--no-originals', action='store_true', help='remove pages once composited')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between progress lines of a manga (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    urls = list(args.urls)
+    if args.file is not None:
+        with (sys.stdin if args.file == '-' else open(args.file, 'r')) as f:
+            urls += [line.strip() for line in f if line.strip() != '' and not line.startswith('#')]
+    if len(urls) == 0:
+        parser.error('no manga urls given')
+
+    from modules.batch import BatchDownload, parse_ranges
+
+    try:
+        ranges = parse_ranges(args.chapters) if args.chapters is not None else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    Settings.manga_save_path = os.path.abspath(args.output)
+
+    batch = BatchDownload(urls, ranges=ranges, jobs=args.jobs, workers=args.workers,
+                          compile_jpg=args.jpg, compile_pdf=args.pdf, keep_originals=not args.no_originals,
+                          interval=args.interval)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: batch.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: batch.stop())
+
+    return 0 if batch.run() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,7 +10,7 @@ from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 
 from dialogs.main_window import Ui_MainWindow
-from modules.internet import have_internet
+from modules.internet import have_internet, monitor
 from modules.settings import Settings
 from modules.internet import have_internet
 from ui.favouriteHandler import FavouriteHandler
@@ -23,6 +23,12 @@ from ui.tree_gen import ThreadedTreeGenerate
 from ui.web import ThreadedWebGenerate
 
 
+def systemd_quote(arg: str) -> str:
+    """ returns (str): (arg) as a single quoted argument of a systemd Exec line, specifiers and variables escaped """
+    arg = arg.replace('\\', '\\\\').replace('"', '\\"').replace('%', '%%').replace('$', '$$')
+    return '"' + arg + '"'
+
+
 class Ui(QMainWindow, ThreadedSearch, ThreadedMangaLoad, ThreadedMangaDownload, ThreadedTreeGenerate,
          ThreadedWebGenerate, PopularPage, Top10List, FavouriteHandler):
     def __init__(self, _app: QApplication):
@@ -36,6 +42,10 @@ class Ui(QMainWindow, ThreadedSearch, ThreadedMangaLoad, ThreadedMangaDownload,
 
         self.app = _app
 
+        # probed in the background, ui actions read the last result
+        monitor.changed.connect(self.on_connectivity_changed)
+        monitor.start()
+
         self.settings = Settings()
         self.dark_palette = QPalette()
         self.init_dark_palette()
@@ -149,6 +159,7 @@ class Ui(QMainWindow, ThreadedSearch, ThreadedMangaLoad, ThreadedMangaDownload,
         self.search['progress_bar'].hide()
         self.search['search_button'].clicked.connect(self._search)
         self.search['next_button'].clicked.connect(self._search_to_manga_download)
+        self._init_search_completer()
 
         self.direct = {
             'input': self.findChild(QLineEdit, 'directDownloadInput'),
@@ -195,7 +206,8 @@ class Ui(QMainWindow, ThreadedSearch, ThreadedMangaLoad, ThreadedMangaDownload,
 
             'composite_label': self.findChild(QLabel, 'compositingLabel'),
             'chapter_list': self.findChild(QPushButton, 'BackToChaptersPushButton'),
-            'open_button': self.findChild(QPushButton, 'progressOpenDirectoryButton')
+            'open_button': self.findChild(QPushButton, 'progressOpenDirectoryButton'),
+            'queue': self.findChild(QListWidget, 'downloadQueueListWidget')
         }
 
         self.progress['chapter_list'].hide()
@@ -204,6 +216,8 @@ class Ui(QMainWindow, ThreadedSearch, ThreadedMangaLoad, ThreadedMangaDownload,
         self.progress['open_button'].hide()
         self.progress['open_button'].clicked.connect(self.on_progress_open_clicked)
 
+        self.progress['queue'].customContextMenuRequested.connect(self.on_download_queue_menu)
+
         self.favourite = {
             'table': self.findChild(QTableWidget, 'FavouriteResultTable'),
             'progress': self.findChild(QProgressBar, 'FavouriteProgressBar'),
@@ -218,6 +232,8 @@ class Ui(QMainWindow, ThreadedSearch, ThreadedMangaLoad, ThreadedMangaDownload,
         self.favourite['remove'].clicked.connect(self.on_favourite_delete)
         self.favourite['go'].clicked.connect(self.on_favourite_go)
 
+        # last check of the update daemon or a refresh, shown until the next refresh
+        self.load_favourite_results()
         if self.settings.settings['startup_fave']:
             self.on_favourite_refresh()
         if self.settings.settings['startup_popular']:
@@ -233,14 +249,17 @@ class Ui(QMainWindow, ThreadedSearch, ThreadedMangaLoad, ThreadedMangaDownload,
         self.setEnabled(True)
 
     def set_fave_startup(self, override=False):
+        """ Runs the favourites update check of daemon.py at login """
         home = os.path.expanduser("~")
         working_directory = os.getcwd()
+        daemon = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'daemon.py')
         if platform.system() == 'Windows':
             vbscript = 'mangak.vbs'
+            pythonw = os.path.join(os.path.dirname(sys.executable), 'pythonw.exe')
 
             extension = os.path.join('AppData', 'Roaming', 'Microsoft', 'Windows', 'Start Menu', 'Programs', 'Startup')
             commands = f"""Set oShell = WScript.CreateObject("WScript.shell")
-            oShell.Run "cmd /c cd {working_directory} & javaw -jar {os.path.join(working_directory, Settings.kfave_path)}", 0, false"""
+            oShell.Run "cmd /c cd {working_directory} & ""{pythonw}"" ""{daemon}"" --once --directory .", 0, false"""
 
             if not override and os.path.exists(os.path.join(home, extension, vbscript)):
                 return
@@ -250,7 +269,49 @@ class Ui(QMainWindow, ThreadedSearch, ThreadedMangaLoad, ThreadedMangaDownload,
 
             with open(os.path.join(home, extension, vbscript), 'w') as f:
                 f.write(commands)
+        elif platform.system() == 'Linux':
+            unit = 'mangak-updates.service'
+
+            extension = os.path.join('.config', 'systemd', 'user')
+            commands = f"""[Unit]
+Description=MangaK favourites update check
+Wants=network-online.target
+After=network-online.target
+
+[Service]
+Type=simple
+WorkingDirectory={working_directory.replace('%', '%%')}
+ExecStart={' '.join(systemd_quote(arg) for arg in (sys.executable, daemon, '--directory', working_directory))}
+Restart=on-failure
+
+[Install]
+WantedBy=default.target
+"""
+
+            if not override and os.path.exists(os.path.join(home, extension, unit)):
+                return
+
+            os.makedirs(os.path.join(home, extension), exist_ok=True)
+            with open(os.path.join(home, extension, unit), 'w') as f:
+                f.write(commands)
+
+            if override:
+                QMessageBox.information(self, 'Update check at login',
+                                        'Written to {}\nEnable it with: systemctl --user enable --now {}'.format(
+                                            os.path.join(home, extension, unit), unit))
+
+
+    def closeEvent(self, event):
+        # requests in flight are aborted so their threads wind down with the window
+        for token in (self.codec.token, self.popular_codec.token, self.loader.token, self.favourite_handle.token):
+            token.cancel()
+        super().closeEvent(event)
 
+    def on_connectivity_changed(self, online: bool):
+        if online:
+            self.statusBar().showMessage('Back online', 5000)
+        else:
+            self.statusBar().showMessage('Offline, {} is not reachable'.format(monitor.url))
 
     def on_direct_download(self):
         if not have_internet():
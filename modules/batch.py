@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+from modules.chapterList import ChapterListDownloader
+from modules.manga_page import MangaPage
+from modules.settings import Settings
+
+
+def parse_ranges(text: str) -> list:
+    """
+    text (str): comma separated chapter positions and ranges, 1 is the oldest chapter
+                '5', '1-10', '20-' (20 to the newest), '-3' (up to 3)
+
+    returns (list): [(first, last)] with last None for an open end
+    """
+    ranges = []
+    for part in text.split(','):
+        part = part.strip()
+        match = re.fullmatch(r'(\d*)\s*-\s*(\d*)|(\d+)', part)
+        if match is None or part == '-':
+            raise ValueError(f"'{part}' is not a chapter or chapter range")
+
+        if match.group(3) is not None:
+            ranges.append((int(match.group(3)), int(match.group(3))))
+        else:
+            first = int(match.group(1)) if match.group(1) else 1
+            last = int(match.group(2)) if match.group(2) else None
+            ranges.append((first, last))
+    return ranges
+
+
+def select_chapters(chapters: list, ranges: list) -> list:
+    """
+    chapters (list): chapters oldest first
+    ranges (list): ranges of parse_ranges, every chapter if None
+
+    returns (list): the chapters in any range, oldest first
+    """
+    if ranges is None:
+        return chapters[:]
+
+    return [chapter for position, chapter in enumerate(chapters, 1)
+            if any(first <= position and (last is None or position <= last) for first, last in ranges)]
+
+
+class BatchDownload(object):
+    """
+    Downloads mangas without a ui, reporting progress as json lines
+
+    Every line is an object with 'event' and 'url':
+    listed (title, chapters), progress (DownloadProgress.snapshot), composition (text),
+    finished (completed, missing pages by chapter), failed (error)
+    """
+
+    def __init__(self, urls: list, *, ranges: list = None, jobs: int = 1, workers: int = None,
+                 compile_jpg: bool = False, compile_pdf: bool = False, keep_originals: bool = True,
+                 interval: float = 1.0, out=None):
+        """
+        urls (list): manga page urls
+        ranges (list): chapters of every manga to download, see parse_ranges, every chapter if None
+        jobs (int): mangas downloaded at once
+        workers (int): pages downloaded at once per manga, Settings.page_download_workers if None
+        interval (float): seconds between progress lines of a manga
+        out (file): where json lines are written, stdout if None
+        """
+        self.urls = urls
+        self.ranges = ranges
+        self.jobs = jobs
+        self.workers = workers if workers is not None else Settings.page_download_workers
+        self.compile_jpg = compile_jpg
+        self.compile_pdf = compile_pdf
+        self.keep_originals = keep_originals
+        self.interval = interval
+        self.out = out if out is not None else sys.stdout
+
+        self.stopping = threading.Event()
+        self._downloaders = set()
+        self._lock = threading.Lock()
+
+    def run(self) -> bool:
+        """ returns (bool): True if every manga downloaded completely """
+        os.makedirs(Settings.manga_save_path, exist_ok=True)
+
+        # compositions print their steps, stdout is kept for the json lines
+        with redirect_stdout(sys.stderr), ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            return all(list(executor.map(self.download, self.urls)))
+
+    def stop(self) -> None:
+        """ Stops every running download, their journals are kept so a new run resumes them """
+        self.stopping.set()
+        with self._lock:
+            for downloader in self._downloaders:
+                downloader.stop()
+
+    def download(self, url: str) -> bool:
+        """ returns (bool): True if the selected chapters of (url) downloaded completely """
+        if self.stopping.is_set():
+            return False
+
+        try:
+            page = MangaPage.load(url, max_age=0)
+            chapters = select_chapters(list(reversed(page.chapters)), self.ranges)
+            title = page.title
+        except Exception as e:
+            self.emit('failed', url, error=str(e))
+            return False
+
+        self.emit('listed', url, title=title, chapters=len(chapters))
+
+        downloader = ChapterListDownloader()
+        downloader.manga_name = ChapterListDownloader.safe_name(title)
+        downloader.compile_jpg = self.compile_jpg
+        downloader.compile_pdf = self.compile_pdf
+        downloader.keep_originals = self.keep_originals
+        downloader.page_workers = self.workers
+
+        # running the same command again resumes from the journal
+        downloader.resume('batch', url, chapters)
+        downloader.connect_composition(lambda text: self.emit('composition', url, text=text))
+
+        # stop() may have run while the chapters were listed, it only reaches downloaders already added
+        with self._lock:
+            if self.stopping.is_set():
+                return False
+            self._downloaders.add(downloader)
+
+        done = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(url, downloader, done), daemon=True)
+        reporter.start()
+        error = None
+        try:
+            completed = downloader.download()
+        except Exception as e:
+            error = e
+        finally:
+            done.set()
+            reporter.join()
+            with self._lock:
+                self._downloaders.discard(downloader)
+
+        # once the reporter is done, so no progress line follows it
+        if error is not None:
+            self.emit('failed', url, error=str(error))
+            return False
+
+        self.emit('finished', url, completed=completed, missing=downloader.missing_pages)
+        return completed
+
+    def emit(self, event: str, url: str, **data) -> None:
+        line = json.dumps(dict(event=event, url=url, time=time.time(), **data))
+        with self._lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def _report(self, url: str, downloader: ChapterListDownloader, done: threading.Event) -> None:
+        """ Polls the progress of (downloader) until (done) """
+        while not done.wait(self.interval):
+            self.emit('progress', url, **downloader.progress.snapshot())
+        self.emit('progress', url, **downloader.progress.snapshot())
@@ -0,0 +1,78 @@
+import socket
+import threading
+from contextlib import contextmanager
+
+
+class Cancelled(Exception):
+    """ Raised inside a worker once its CancelToken is cancelled """
+
+
+class CancelToken(object):
+    """
+    Shared between a worker and whoever may abort it
+
+    Cancelling shuts down the sockets of responses being read under the token so a blocked read
+    returns at once, workers check the token between requests and parsing steps
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._responses = set()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+        with self._lock:
+            responses = list(self._responses)
+        for response in responses:
+            _abort(response)
+
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise Cancelled()
+
+    def wait(self, seconds: float) -> None:
+        """ Sleeps (seconds), raises Cancelled as soon as the token is cancelled """
+        if self._event.wait(seconds):
+            raise Cancelled()
+
+    @contextmanager
+    def reading(self, response):
+        """
+        response (Response): streamed response read inside the block
+
+        Errors of a read aborted by cancel are raised as Cancelled
+        """
+        with self._lock:
+            self._responses.add(response)
+        try:
+            self.raise_if_cancelled()
+            yield response
+        except Cancelled:
+            raise
+        except Exception as e:
+            if self._event.is_set():
+                raise Cancelled() from e
+            raise
+        finally:
+            with self._lock:
+                self._responses.discard(response)
+        self.raise_if_cancelled()
+
+
+def _abort(response) -> None:
+    """ Unblocks a read of (response) running on another thread """
+    # urllib3 keeps no public handle on the socket, once the headers are read it only lives in the body reader
+    sock = getattr(getattr(response.raw, '_connection', None), 'sock', None)
+    if sock is None:
+        body = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+        sock = getattr(getattr(body, 'raw', None), '_sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # already closed
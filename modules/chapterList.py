@@ -1,17 +1,26 @@
 import os
+import re
+import hashlib
 import shutil
-import sys
-import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import requests
-from bs4 import BeautifulSoup
 from PyQt5 import uic
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
-from requests.exceptions import InvalidSchema, InvalidURL, MissingSchema
+from requests.exceptions import HTTPError, RequestException
 
+from modules import fetch, parser, session
+from modules.cancel import CancelToken, Cancelled
 from modules.favourite import Favourite
+from modules.journal import DownloadJournal
+from modules.limiter import add_listener, limiter_for, remove_listener
+from modules.manga_page import MangaPage
+from modules.progress import DownloadProgress, Throttle
 from modules.settings import Settings
+from modules.writer import IncompleteBody, StreamWriter
 from modules.compostion import dir_to_pdf, stack
 from modules.tree import generate_chapter_tree
 
@@ -33,58 +42,61 @@ class ChapterListLoader(QObject):
         self.u_names = []
         self.u_links = []
 
+        self.token = CancelToken()
+
     def load(self):
-        r = None
+        token = self.token
+        self.loaded_list = []
         try:
-            r = requests.get(self.manga_link)
-        except InvalidURL or InvalidSchema or MissingSchema:
+            # always revalidated, a page cached before a favourites refresh may miss the new chapters
+            page = MangaPage.load(self.manga_link, max_age=0, token=token)
+            title, chapters = page.title, page.chapters
+        except Cancelled:
+            # superseded by another manga, finished lets the ui start it
+            self.finished.emit()
+            return
+        except (RequestException, AttributeError):
+            # an invalid url, a request that failed after its retries or a page that is not a manga
             self.valid_url.emit(False)
+            self.finished.emit()
             return
         else:
             self.valid_url.emit(True)
 
-        soup = BeautifulSoup(r.content, "html.parser")
-        chapterbox = soup.find_all(class_="chapter-list")
-        rows = chapterbox[0].find_all(class_="row")
-        title = soup.find(class_="manga-info-text").find("h1").text
+        if token.is_cancelled():
+            self.finished.emit()
+            return
+
         self.title.emit(title)
-        self.maximum.emit(len(rows))
+        self.maximum.emit(len(chapters))
 
         count = 0
-        self.loaded_list = []
-        for i in range(len(rows) - 1, -1, -1):
-            self.loaded_list.append({
-                'name': rows[i].find('a', href=True).text,
-                'href': rows[i].find('a', href=True)['href']
-            })
+        throttle = Throttle()
+        for chapter in reversed(chapters):
+            self.loaded_list.append(dict(chapter))
             count += 1
-            self.progress.emit(count)
+            if throttle.ready() or count == len(chapters):
+                self.progress.emit(count)
 
-        # check for favourite if so update information
-        self.favourited = Favourite.is_favourite(self.manga_link)
+        # check for favourite if so update information from the page already parsed
+        favourite = Favourite.get_entry(self.manga_link)
+        self.favourited = favourite is not None
         if self.favourited:
-            self.u_names, self.u_links = Favourite.get_updated_chapters(self.manga_link)
+            self.u_names, self.u_links = page.updated_since(favourite['lastChapter']['url'])
 
         self.finished.emit()
 
 class ChapterListDownloader(QObject):
-    
-    finished = pyqtSignal()
-
-    total_title_changed = pyqtSignal(str)
-    chapter_title_changed = pyqtSignal(str)
-    page_title_changed = pyqtSignal(str)
 
-    total_maximum_changed = pyqtSignal(int)
-    chapter_maximum_changed = pyqtSignal(int)
-    page_maximum_changed = pyqtSignal(int)
+    # pages downloading at once across every downloader
+    budget = threading.BoundedSemaphore(Settings.download_budget)
 
-    total_progress_changed = pyqtSignal(int)
-    chapter_progress_changed = pyqtSignal(int)
-    page_progress_changed = pyqtSignal(int)
+    finished = pyqtSignal()
 
     composition_label_changed = pyqtSignal(str)
 
+    limits_changed = pyqtSignal(str, int, float)  # host, max in flight, requests per second
+
     def __init__(self):
         super().__init__()
 
@@ -94,112 +106,318 @@ class ChapterListDownloader(QObject):
         self.compile_jpg = None
         self.compile_pdf = None
         self.keep_originals = None
+        self.page_workers = Settings.page_download_workers
+        self.fetch_policy = fetch.FetchPolicy()
 
-    def download(self):
+        self.journal = DownloadJournal()
+        self.completed_pages = {}  # {chapter href: {page url: size}} already on disk
+        self.missing_pages = {}  # {chapter href: [page url]} the server refused for good, left out of the chapter
+        self.stopping = threading.Event()
+        self.progress = DownloadProgress()  # read with progress.snapshot()
+
+    def download(self) -> bool:
+        """
+        returns (bool): False if the download was stopped before every chapter completed
 
-        self.create_dlog(self.manga_name, self.chapter_list)
-        self.total_maximum_changed.emit(len(self.chapter_list))
-        self.total_progress_changed.emit(0)
+        Downloads every chapter in chapter_list, a stopped download keeps its journal to be resumed
+        """
+        self.journal.start(self.manga_name, self.chapter_list, self.completed_pages)
+        self.progress.reset(len(self.chapter_list))
+        self.missing_pages = {}
 
         # Setting manga directory
         manga_directory = os.path.join(Settings.manga_save_path, self.manga_name)
         if not os.path.exists(manga_directory):
             os.mkdir(manga_directory)
 
-        chapter_amount = len(self.chapter_list)
-        # Loop through all chapters in chapter list
-        for i in range(len(self.chapter_list)):
-            chapter_href = self.chapter_list[i]['href']
+        # stages are linked by bounded queues so page lists are resolved ahead of and
+        # compositions run behind the chapter currently downloading
+        stop = self.stopping
+        resolved = queue.Queue(maxsize=Settings.pipeline_queue_size)
+        downloaded = queue.Queue(maxsize=Settings.pipeline_queue_size)
+        errors = []
 
-            page_list = self.get_page_list(chapter_href)
+        resolver = threading.Thread(target=self._resolve_stage, args=(resolved, stop), daemon=True)
+        compositor = threading.Thread(target=self._composite_stage, args=(downloaded, stop, errors), daemon=True)
+        resolver.start()
+        compositor.start()
 
-            chapter_name = chapter_href.split('/')[-1]
-            self.chapter_title_changed.emit(chapter_name)
+        add_listener(self.on_limits_changed)
+        try:
+            self._download_stage(resolved, downloaded, stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            downloaded.put(None)  # composition always drains so this can block safely
+            compositor.join()
+            remove_listener(self.on_limits_changed)
 
-            # Setting chapter directory
-            chapter_directory = os.path.join(Settings.manga_save_path, self.manga_name, chapter_name)
-            if not os.path.exists(chapter_directory):
-                os.mkdir(chapter_directory)
+        if errors:
+            self.journal.close()
+            raise errors[0]
 
-            self.chapter_progress_changed.emit(0)
-            self.chapter_maximum_changed.emit(len(page_list))
+        if stop.is_set():
+            self.journal.close()
+            return False
 
-            # download all pages
-            for j in range(len(page_list)):
-                page = page_list[j]
-                self.save_image(page, chapter_directory)
-                self.chapter_progress_changed.emit(j + 1)
+        self.journal.remove()
 
-            # Do compositions here
-            if self.compile_jpg:
-                # jpg
-                self.composition_label_changed.emit('Compositing [{}] to JPG'.format(chapter_name))
+        if self.keep_originals:
+            generate_chapter_tree(manga_directory)
+        
+        self.finished.emit()
+        return True
 
-                jpg_dir = os.path.join(Settings.manga_save_path, self.manga_name, Settings.jpg_composite_path)
-                if not os.path.exists(jpg_dir):
-                    os.mkdir(jpg_dir)
-                
-                stack(chapter_directory, jpg_dir)
+    @staticmethod
+    def safe_name(title: str) -> str:
+        """ returns (str): (title) without the characters file systems refuse, the name of its directory """
+        return re.sub(r'[/\\:*"<>|\?]', '', title)
 
-            if self.compile_pdf:
-                # pdf
-                self.composition_label_changed.emit('Compositing [{}] to PDF'.format(chapter_name))
+    def resume(self, kind: str, url: str, chapters: list) -> None:
+        """
+        kind (str): what runs the download, 'batch' or 'daemon', their journals are kept apart
+        url (str): manga page url, the same url always resumes the same journal
+        chapters (list): chapters to download, oldest first
 
-                pdf_dir = os.path.join(Settings.manga_save_path, self.manga_name, Settings.pdf_composite_path)
-                if not os.path.exists(pdf_dir):
-                    os.mkdir(pdf_dir)
-                
-                dir_to_pdf(chapter_directory, pdf_dir)
+        Opens the journal of (url), chapters an interrupted run left go before the new ones of (chapters)
+        """
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        self.journal = DownloadJournal(os.path.join(Settings.manga_save_path, Settings.download_jobs_path,
+                                                    kind + '-' + key + '.jsonl'))
+        self.chapter_list = chapters
+
+        state = self.journal.compact()
+        if state is not None:
+            _, remaining, self.completed_pages = state
+            known = set(chapter['href'] for chapter in remaining)
+            self.chapter_list = remaining + [chapter for chapter in chapters if chapter['href'] not in known]
+
+    def connect_composition(self, callback) -> None:
+        """
+        callback (callable): called with the text of every composition step
 
-            if not self.keep_originals:
-                self.composition_label_changed.emit('Removing [{}]'.format(chapter_name))
-                shutil.rmtree(chapter_directory)
+        For downloads run without an event loop, (callback) runs on the compositing thread
+        """
+        def on_composition(text):
+            if text != '':
+                callback(text)
 
-            self.composition_label_changed.emit('')
+        self.composition_label_changed.connect(on_composition, Qt.DirectConnection)
 
-            self.chapter_progress_changed.emit(0)
-            self.total_progress_changed.emit(i + 1)
+    def on_limits_changed(self, host: str, max_in_flight: int, rate: float) -> None:
+        self.limits_changed.emit(host, max_in_flight, rate)
 
-            # update download log
-            if i+1 == chapter_amount:
-                os.remove(os.path.join(Settings.manga_save_path, Settings.download_log))
-            else:
-                self.create_dlog(self.manga_name, self.chapter_list[i+1:])
+    def stop(self) -> None:
+        """ Stops the download after the pages in flight, can be called from any thread """
+        self.stopping.set()
 
-        if self.keep_originals:
-            generate_chapter_tree(manga_directory)
-        
-        self.finished.emit()
+    def _resolve_stage(self, resolved: queue.Queue, stop: threading.Event) -> None:
+        """ Fetches the page list of every chapter ahead of the download stage """
+        try:
+            for i in range(len(self.chapter_list)):
+                if stop.is_set():
+                    return
+
+                chapter_href = self.chapter_list[i]['href']
+                page_list = self.get_page_list(chapter_href)
+                self.progress.chapter_resolved(len(page_list))
+                if not self._put(resolved, (i, chapter_href, page_list), stop):
+                    return
+        except Exception as e:
+            self._put(resolved, e, stop)
+        else:
+            self._put(resolved, None, stop)
+
+    def _download_stage(self, resolved: queue.Queue, downloaded: queue.Queue, stop: threading.Event) -> None:
+        """ Downloads the pages of each resolved chapter and hands the chapter to composition """
+        while True:
+            item = self._get(resolved, stop)
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+
+            i, chapter_href, page_list = item
+
+            chapter_name = chapter_href.split('/')[-1]
+            self.progress.chapter_started(chapter_name, len(page_list))
+
+            # Setting chapter directory
+            chapter_directory = os.path.join(Settings.manga_save_path, self.manga_name, chapter_name)
+            if not os.path.exists(chapter_directory):
+                os.mkdir(chapter_directory)
 
-    def save_image(self, url: str, directory: str) -> None:
+            # download all pages, (page_workers) at a time
+            with ThreadPoolExecutor(max_workers=max(1, min(self.page_workers, len(page_list)))) as executor:
+                futures = [executor.submit(self.save_page, chapter_href, page, chapter_directory) for page in page_list]
+                for future in as_completed(futures):
+                    future.result()
+
+            if not self._put(downloaded, (i, chapter_href, chapter_name, chapter_directory), stop):
+                return
+
+    def _composite_stage(self, downloaded: queue.Queue, stop: threading.Event, errors: list) -> None:
+        """ Composites, cleans up and logs downloaded chapters in order """
+        while True:
+            item = downloaded.get()
+            if item is None:
+                return
+            if stop.is_set():
+                continue  # drain without working so the download stage never blocks
+
+            i, chapter_href, chapter_name, chapter_directory = item
+            try:
+                self.composite_chapter(chapter_name, chapter_directory)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+                continue
+
+            self.progress.chapter_finished()
+            self.journal.chapter_done(chapter_href)
+
+    def composite_chapter(self, chapter_name: str, chapter_directory: str) -> None:
+        # Do compositions here
+        if self.compile_jpg:
+            # jpg
+            self.composition_label_changed.emit('Compositing [{}] to JPG'.format(chapter_name))
+
+            jpg_dir = os.path.join(Settings.manga_save_path, self.manga_name, Settings.jpg_composite_path)
+            if not os.path.exists(jpg_dir):
+                os.mkdir(jpg_dir)
+            
+            stack(chapter_directory, jpg_dir)
+
+        if self.compile_pdf:
+            # pdf
+            self.composition_label_changed.emit('Compositing [{}] to PDF'.format(chapter_name))
+
+            pdf_dir = os.path.join(Settings.manga_save_path, self.manga_name, Settings.pdf_composite_path)
+            if not os.path.exists(pdf_dir):
+                os.mkdir(pdf_dir)
+            
+            dir_to_pdf(chapter_directory, pdf_dir)
+
+        if not self.keep_originals:
+            self.composition_label_changed.emit('Removing [{}]'.format(chapter_name))
+            shutil.rmtree(chapter_directory)
+
+        self.composition_label_changed.emit('')
+
+    @staticmethod
+    def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+        """ Put (item) on (q) unless the pipeline is stopped first, returns whether it was put """
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(q: queue.Queue, stop: threading.Event):
+        """ Get an item from (q), returns None once the pipeline is stopped """
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+
+    def save_image(self, url: str, directory: str, expected_size: int = None) -> None:
         """
         url (String): online image file path
         directory (String): Image file save path
+        expected_size (int): size of the page when it was last completed, skips asking the server
 
         returns: None
 
         This function downloads [url] and prints the progress of the download to the console and save the file to [directory]
+        The download is written to a partial file that is renamed once complete, an interrupted partial file is resumed
+        with a range request and a page that already exists with the size reported by the server is skipped.
+        A page whose size can not be confirmed is downloaded again and only replaced once complete
         """
         filename = url.split('/')[-1]
-        self.page_title_changed.emit(filename)
-        with open(os.path.join(directory, filename), 'wb') as f:
-            response = requests.get(url, stream=True)
 
-            total_length = response.headers.get('content-length')
-            if total_length is None:  # no content length header
-                f.write(response.content)
+        path = os.path.join(directory, filename)
+        part_path = path + Settings.partial_extension
+
+        if os.path.exists(path):
+            expected = expected_size if expected_size is not None else self.get_remote_size(url)
+            size = os.path.getsize(path)
+            if size == expected:
+                return
+            elif expected is None:
+                pass  # kept until the new download completes
+            elif size < expected:
+                os.replace(path, part_path)  # truncated page, resume the missing bytes
+            else:
+                os.remove(path)
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset > 0 else {}
+
+        # the host slot is held until the body is read
+        with limiter_for(url).slot() as slot:
+            response = self.fetch_policy.get(url, hedge=True, slot=slot, stream=True, headers=headers)
+
+            restart = offset > 0 and response.status_code == 416
+            if restart:
+                # partial file does not fit the remote file, start over
+                response.close()
+                os.remove(part_path)
+            elif response.status_code not in (200, 206):
+                # an error page never becomes the page
+                response.close()
             else:
-                dl = 0
-                total_length = int(total_length)
+                self._write_response(response, url, part_path, offset if response.status_code == 206 else 0)
+
+        if restart:
+            return self.save_image(url, directory)
+
+        # raised once the slot is released with the status, so only 429/5xx back the host off
+        if response.status_code not in (200, 206):
+            raise HTTPError('{} for {}'.format(response.status_code, url), response=response)
+
+        os.replace(part_path, path)
+
+    def _write_response(self, response, url: str, part_path: str, offset: int) -> None:
+        """
+        response (Response): streamed response of the page
+        url (String): online image file path
+        part_path (String): partial file to write to
+        offset (int): bytes of the page already in the partial file, 0 rewrites it
+        """
+        total_length = response.headers.get('content-length')
+        total_length = int(total_length) + offset if total_length is not None else None
+
+        # 0 tells the progress the size is not known
+        self.progress.page_started(url, url.split('/')[-1], total_length or 0, offset)
 
-                self.page_maximum_changed.emit(total_length)
+        writer = StreamWriter(part_path, offset, total_length)
+        size = writer.write(response, lambda amount: self.progress.page_received(url, amount))
 
-                chunksize = int(total_length / 100)
-                for data in response.iter_content(chunk_size=chunksize):
-                    dl += len(data)
-                    f.write(data)
+        # a connection closed early reads as the end of the body, the retry resumes the missing bytes
+        encoded = response.headers.get('content-encoding', 'identity') != 'identity'
+        if total_length is not None and not encoded and size != total_length:
+            raise IncompleteBody('{} of {} bytes read from {}'.format(size, total_length, url))
+
+    def get_remote_size(self, url: str):
+        """
+        url (String): online file path
+
+        returns (int): size reported by the server or None if it is not known
+        """
+        with limiter_for(url).slot() as slot:
+            response = session.head(url, allow_redirects=True)
+            slot.record(response)
 
-                    self.page_progress_changed.emit(dl)
+        total_length = response.headers.get('content-length')
+        if response.status_code != 200 or total_length is None:
+            return None
+        return int(total_length)
 
     def get_page_list(self, chapter_path):
         """
@@ -207,18 +425,55 @@ class ChapterListDownloader(QObject):
 
         returns (list): pages of the chapter
         """
-        r = requests.get(chapter_path)
-        soup = BeautifulSoup(r.content, "html.parser")
-        pagebox = soup.find(id="vungdoc")
+        with limiter_for(chapter_path).slot() as slot:
+            r = self.fetch_policy.get(chapter_path, hedge=True, slot=slot)
+
+        pagebox = parser.find(r.content, attrs={'id': 'vungdoc'})
         rows = pagebox.find_all('img')
         pages = []
         for row in rows:
             pages.append(row['src'])
         return pages
 
-    def create_dlog(self, manga_name: str, chapter_list: list) -> None:
-        with open(os.path.join(Settings.manga_save_path, Settings.download_log), 'w') as dlog:
-            json.dump({
-                'name': manga_name,
-                'list': chapter_list
-            }, dlog)
\ No newline at end of file
+    def save_page(self, chapter_href: str, url: str, directory: str) -> None:
+        """
+        chapter_href (String): path of the chapter the page belongs to
+        url (String): online image file path
+        directory (String): Image file save path
+
+        Saves the page and records it in the download journal
+        A connection that stalls while reading the page is retried, resuming from the partial file
+        """
+        if self.stopping.is_set():
+            return
+
+        with self.budget:
+            self._save_page(chapter_href, url, directory)
+
+    def _save_page(self, chapter_href: str, url: str, directory: str) -> None:
+        # the fetch policy already retried the request, only a body cut off after it is retried here
+        for attempt in range(self.fetch_policy.retries + 1):
+            try:
+                self.save_image(url, directory, self.completed_pages.get(chapter_href, {}).get(url))
+                break
+            except IncompleteBody:
+                if attempt == self.fetch_policy.retries:
+                    raise
+                time.sleep(self.fetch_policy.delay(attempt))
+            except HTTPError as e:
+                status = e.response.status_code
+                if status >= 500 or status == 429:
+                    raise
+                # gone or refused for good, the rest of the manga still downloads
+                self._page_missing(chapter_href, url, status)
+                return
+
+        self.journal.page_done(chapter_href, url, os.path.getsize(os.path.join(directory, url.split('/')[-1])))
+        self.progress.page_finished(url)
+
+    def _page_missing(self, chapter_href: str, url: str, status: int) -> None:
+        """ Records a page the server refused with (status), its chapter is completed without it """
+        self.missing_pages.setdefault(chapter_href, []).append(url)
+        self.composition_label_changed.emit('Missing [{}] {} ({})'.format(chapter_href.split('/')[-1],
+                                                                          url.split('/')[-1], status))
+        self.progress.page_finished(url)
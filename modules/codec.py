@@ -1,9 +1,16 @@
-import requests
-from bs4 import BeautifulSoup
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from PyQt5 import uic
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
+from requests.exceptions import RequestException
 
+from modules import fetch, http_cache, parser
+from modules.cancel import CancelToken, Cancelled
+from modules.thumbnail_cache import default_thumbnails
+from modules.title_index import default_index
+from modules.limiter import limiter_for
 from modules.settings import Settings
 from widgets.list.list_extension import PopularListItem
 
@@ -11,6 +18,7 @@ class MKCodec(QObject):
     finished = pyqtSignal()
     maximum = pyqtSignal(int)
     progress = pyqtSignal(int)
+    results_added = pyqtSignal(list)
 
     def __init__(self):
         ''' 
@@ -26,23 +34,42 @@ class MKCodec(QObject):
         self.page_prefix = ''
         self.current_page = 0
         self.max_page = -1
+        self.failed_pages = []  # pages after the first that could not be loaded, their results are missing
+
+        self.token = CancelToken()
 
     def search(self):
         '''
         Searches for the (keyword) on mangakakalot database and updates the variables
         Search result can be accessed as MKCodec.search_result (list)
-        '''
-        if len(self.keyword) < len(self.search_prefix) + 3:
-            return
-
-        r = requests.get(self.keyword)
-        soup = BeautifulSoup(r.content, 'html.parser')
 
+        Pages after the first are fetched concurrently, results_added is emitted with the rows of every page in page order
+        Cancelling (token) stops the search where it is, finished is emitted either way
+        A page after the first that fails is skipped and listed in failed_pages
+        '''
+        token = self.token
         self.search_result = []
+        self.failed_pages = []
+
+        try:
+            if len(self.keyword) >= len(self.search_prefix) + 3:
+                self._search(token)
+        except Cancelled:
+            pass
+        except (RequestException, AttributeError):
+            # the first page could not be loaded or is not a search page
+            traceback.print_exc()
+        finally:
+            self.finished.emit()
+
+    def _search(self, token: CancelToken) -> None:
+        r = fetch.get(self.keyword, token=token)
+        content = r.content
+        token.raise_if_cancelled()
 
         page_list = None
         try:
-            page_list = soup.find('div', {'class': 'group_page'}).find_all('a')
+            page_list = parser.find(content, 'div', {'class': 'group_page'}).find_all('a')
         except AttributeError:
             self.page_prefix = ''
             self.max_page = -1
@@ -52,71 +79,127 @@ class MKCodec(QObject):
             self.max_page = int(page_list[-1].text[5:-1])
             self.maximum.emit(self.max_page)
 
-        count = 0
-        while True:
-            key = self.keyword+self.search_postfix+str(count+1)
-            if count != 0:
-                r = requests.get(key)
-                soup = BeautifulSoup(r.content, 'html.parser')
-
-            self._populate(soup)
-            if self.max_page == -1 or count >= self.max_page - 1:
-                self.progress.emit(self.max_page)
-                self.finished.emit()
-                break
-            
-            count += 1
-            self.progress.emit(count)
-
-    def _populate(self, dish):
+        self._add_results(self._parse_page(content))
+        self.progress.emit(1)
+
+        if self.max_page > 1:
+            with ThreadPoolExecutor(max_workers=Settings.search_workers) as executor:
+                futures = {executor.submit(self._load_page, page, token): page for page in range(2, self.max_page + 1)}
+
+                # pages arrive in any order, rows are added in page order
+                arrived = {}
+                next_page = 2
+                try:
+                    for future in as_completed(futures):
+                        arrived[futures[future]] = future.result()
+                        while next_page in arrived:
+                            token.raise_if_cancelled()
+                            results = arrived.pop(next_page)
+                            if results is None:
+                                self.failed_pages.append(next_page)
+                            else:
+                                self._add_results(results)
+                            self.progress.emit(next_page)
+                            next_page += 1
+                finally:
+                    # pages not started yet are dropped instead of waited on
+                    for future in futures:
+                        future.cancel()
+
+        self.progress.emit(self.max_page)
+
+    def _load_page(self, page: int, token: CancelToken):
+        ''' returns (list): the results of (page) or None if it could not be loaded '''
+        token.raise_if_cancelled()
+
+        url = self.keyword + self.search_postfix + str(page)
+        try:
+            with limiter_for(url).slot() as slot:
+                content = fetch.get(url, slot=slot, token=token).content
+
+            token.raise_if_cancelled()
+            return self._parse_page(content)
+        except (RequestException, AttributeError):
+            return None
+
+    def _add_results(self, results: list) -> None:
+        self.search_result.extend(results)
+        self.results_added.emit(results)
+
+        default_index.add([{'title': result['name'], 'url': result['href'], 'last_chapter': result['last_chapter']}
+                           for result in results], 'search')
+
+    def _parse_page(self, content: bytes) -> list:
         '''
-        dish (BeautifulSoup): Beautiful soup object
+        content (bytes): a search page
 
-        Parses the data (dish) and extracts information and updates object
+        returns (list): the results listed on the page
         '''
-        result_list = dish.find('div', {'class': 'panel_story_list'}).find_all('div', {'class': 'story_item'})
+        dish = parser.find(content, 'div', {'class': 'panel_story_list'})
+        result_list = dish.find_all('div', {'class': 'story_item'})
+
+        results = []
         for result in result_list:
-            self.search_result.append({
+            results.append({
                 'name': result.find('h3', {'class': 'story_name'}).text.strip('\n'),
                 'last_chapter': result.find_all('em', {'class': 'story_chapter'})[0].text.strip('\n'),
                 'href': result.find('a')['href']
                 })
+        return results
 
 class PopularPageCodec(QObject):
 
     finished = pyqtSignal()
     maximum = pyqtSignal(int)
     progress = pyqtSignal(int, dict)
+    thumbnail_loaded = pyqtSignal(int, str, bytes)  # card index, image url, image
     page_updated = pyqtSignal(int)
 
     def __init__(self):
         super().__init__()
 
         self.thumbnails = True
+        self.known_thumbnails = set()  # image urls the ui already shows without being sent them
 
         self.page = 1
         self.url = 'https://mangakakalot.com/manga_list?type=topview&category=all&state=all&page='
         self.max_page = ''
         self.popular = {}
 
+        self.token = CancelToken()
+
     def load_popular(self) -> None:
+        '''
+        Emits the cards of the page as soon as it is parsed, their thumbnails follow with thumbnail_loaded
+        Cancelling (token) stops at the next request or card
+        '''
+        try:
+            self._load_popular(self.token)
+        except Cancelled:
+            pass
+
+        self.finished.emit()
+
+    def _load_popular(self, token: CancelToken) -> None:
         self.page_updated.emit(self.page)
         full_url = self.url + str(self.page)
 
-        r = requests.get(full_url)
-        soup = BeautifulSoup(r.content, 'html.parser')
+        r = http_cache.get(full_url, token=token)
+        token.raise_if_cancelled()
 
-        self.max_page = soup.find('div', {'class': 'group_page'}).find_all('a')[-1].text[5:-1]
+        self.max_page = parser.find(r.content, 'div', {'class': 'group_page'}).find_all('a')[-1].text[5:-1]
 
-        cards = soup.find_all('div', {'class': 'list-truyen-item-wrap'})
+        cards = parser.parse(r.content, 'div', {'class': 'list-truyen-item-wrap'}).find_all('div', {'class': 'list-truyen-item-wrap'})
 
         self.maximum.emit(len(cards))
 
+        seen = []
         count = 0
         for card in cards:
-            
+            token.raise_if_cancelled()
+
             data = {
-                'image_bytes': requests.get(card.find_all('a')[0].find('img')['src']).content if self.thumbnails else None,
+                'thumbnail': card.find_all('a')[0].find('img')['src'],
                 'url': card.find_all('a')[0]['href'],
                 'manga_title': card.find('h3').text.strip('\n'),
                 'last_chapter': card.find('a', {'class': 'list-story-item-wrap-chapter'}).text.strip('\n'),
@@ -124,10 +207,59 @@ class PopularPageCodec(QObject):
                 'description': card.find('p').text.strip('\n')
             }
 
+            seen.append({'title': data['manga_title'], 'url': data['url'], 'last_chapter': data['last_chapter']})
+
             count+=1
             self.progress.emit(count, data)
 
-        self.finished.emit()
+        default_index.add(seen, 'popular')
+
+        if self.thumbnails:
+            self._load_thumbnails([card.find_all('a')[0].find('img')['src'] for card in cards], token)
+
+    def _load_thumbnails(self, urls: list, token: CancelToken) -> None:
+        ''' Fetches the covers of (urls) a few at a time, each emitted with the index of its card as it arrives '''
+        known = self.known_thumbnails
+        for url in urls:
+            if url in known:
+                default_thumbnails.touch(url)
+
+        try:
+            with ThreadPoolExecutor(max_workers=Settings.thumbnail_workers) as executor:
+                futures = {executor.submit(self._load_thumbnail, url, token): i
+                           for i, url in enumerate(urls) if url not in known}
+                try:
+                    for future in as_completed(futures):
+                        image = future.result()
+                        token.raise_if_cancelled()
+                        if image is not None:
+                            self.thumbnail_loaded.emit(futures[future], urls[futures[future]], image)
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            default_thumbnails.flush()
+
+    @staticmethod
+    def _load_thumbnail(url: str, token: CancelToken):
+        ''' returns (bytes): the image at (url) or None if it could not be fetched, the card keeps its placeholder '''
+        image = default_thumbnails.load(url)
+        if image is not None:
+            return image
+
+        token.raise_if_cancelled()
+        try:
+            with limiter_for(url).slot() as slot:
+                r = fetch.get(url, slot=slot, token=token)
+        except RequestException:
+            return None
+
+        # an html error or hotlink page is never kept as a cover
+        if r.status_code != 200 or not r.headers.get('content-type', '').startswith('image/'):
+            return None
+
+        default_thumbnails.store(url, r.content)
+        return r.content
 
     def increment_page(self):
         if self.max_page == '':
@@ -140,10 +272,9 @@ class PopularPageCodec(QObject):
     def get_max_page(self):
         full_url = self.url + str(self.page)
 
-        r = requests.get(full_url)
-        soup = BeautifulSoup(r.content, 'html.parser')
+        r = http_cache.get(full_url)
 
-        self.max_page = soup.find('div', {'class': 'group_page'}).find_all('a')[-1].text[5:-1]
+        self.max_page = parser.find(r.content, 'div', {'class': 'group_page'}).find_all('a')[-1].text[5:-1]
 
 class Top10Codec(QObject):
 
@@ -155,11 +286,10 @@ class Top10Codec(QObject):
         self.top10 = []
 
     def load_top10(self):
-        r = requests.get(Settings.mangakakalot_home)
-        soup = BeautifulSoup(r.content, 'html.parser')
+        r = http_cache.get(Settings.mangakakalot_home)
 
         self.top10.clear()
-        blocks = soup.find_all('div', {'class': 'xem-nhieu-item'})
+        blocks = parser.parse(r.content, 'div', {'class': 'xem-nhieu-item'}).find_all('div', {'class': 'xem-nhieu-item'})
         for block in blocks:
             details = block.find('a')
             self.top10.append({
@@ -168,4 +298,6 @@ class Top10Codec(QObject):
                 'last_chapter': details.text.strip('\n').split('-')[-1][1:]
             })
 
+        default_index.add([{'title': block['manga'], 'url': block['href'], 'last_chapter': block['last_chapter']}
+                           for block in self.top10], 'top10')
         self.finished.emit()
\ No newline at end of file
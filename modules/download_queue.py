@@ -0,0 +1,230 @@
+import os
+import json
+import threading
+import uuid
+
+from PyQt5.QtCore import *
+
+from modules.chapterList import ChapterListDownloader
+from modules.journal import DownloadJournal
+from modules.settings import Settings
+
+
+class DownloadQueue(QObject):
+    """
+    Persistent queue of manga download jobs
+
+    Jobs are dicts {'id', 'name', 'list', 'priority', 'state', 'compile_jpg', 'compile_pdf', 'keep_originals'}
+    state is one of queued, paused or running, finished and cancelled jobs are dropped
+    Up to Settings.concurrent_jobs run at once and share ChapterListDownloader.budget
+    """
+
+    finished = pyqtSignal()
+    changed = pyqtSignal()
+    job_started = pyqtSignal(str, object)  # id, ChapterListDownloader
+    job_finished = pyqtSignal(str, bool)  # id, completed
+
+    def __init__(self, path: str = None):
+        super().__init__()
+
+        self.path = path if path is not None else os.path.join(Settings.manga_save_path, Settings.download_queue_file)
+
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._running = {}  # id: ChapterListDownloader
+
+        self.jobs = self._load()
+
+    def add(self, manga_name: str, chapter_list: list, *, priority: int = 0, compile_jpg: bool = False,
+            compile_pdf: bool = False, keep_originals: bool = True) -> str:
+        """ Adds a job behind every job of the same priority, returns its id """
+        job = {
+            'id': uuid.uuid4().hex,
+            'name': manga_name,
+            'list': chapter_list,
+            'priority': priority,
+            'state': 'queued',
+            'compile_jpg': compile_jpg,
+            'compile_pdf': compile_pdf,
+            'keep_originals': keep_originals
+        }
+        with self._lock:
+            self.jobs.append(job)
+            self._save()
+
+        self._changed()
+        return job['id']
+
+    def pause(self, job_id: str) -> None:
+        """ Pauses a job, a running job stops after its current pages and resumes from its journal """
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                return
+
+            job['state'] = 'paused'
+            if job_id in self._running:
+                self._running[job_id].stop()
+            self._save()
+
+        self._changed()
+
+    def resume(self, job_id: str) -> None:
+        with self._lock:
+            job = self.get(job_id)
+            if job is None or job['state'] != 'paused' or job_id in self._running:
+                return
+
+            job['state'] = 'queued'
+            self._save()
+
+        self._changed()
+
+    def cancel(self, job_id: str) -> None:
+        """ Stops and drops a job along with its journal """
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                return
+
+            self.jobs.remove(job)
+            if job_id in self._running:
+                self._running[job_id].stop()
+            else:
+                self.journal(job_id).remove()
+            self._save()
+
+        self._changed()
+
+    def move(self, job_id: str, offset: int) -> None:
+        """ Moves a job (offset) places towards the back of the queue """
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                return
+
+            index = max(0, min(len(self.jobs) - 1, self.jobs.index(job) + offset))
+            self.jobs.remove(job)
+            self.jobs.insert(index, job)
+            self._save()
+
+        self._changed()
+
+    def set_priority(self, job_id: str, priority: int) -> None:
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                return
+
+            job['priority'] = priority
+            self._save()
+
+        self._changed()
+
+    def get(self, job_id: str):
+        with self._lock:
+            for job in self.jobs:
+                if job['id'] == job_id:
+                    return job
+        return None
+
+    def pending(self) -> int:
+        """ returns (int): amount of jobs waiting to run """
+        with self._lock:
+            return len([job for job in self.jobs if job['state'] == 'queued'])
+
+    def journal(self, job_id: str) -> DownloadJournal:
+        return DownloadJournal(os.path.join(Settings.manga_save_path, Settings.download_jobs_path, job_id + '.jsonl'))
+
+    def run(self) -> None:
+        """ Runs queued jobs until none are left """
+        while True:
+            with self._lock:
+                while len(self._running) < Settings.concurrent_jobs:
+                    job = self._next()
+                    if job is None:
+                        break
+                    self._start(job)
+
+                if len(self._running) == 0:
+                    break
+
+            self._wakeup.wait(0.5)
+            self._wakeup.clear()
+
+        self.finished.emit()
+
+    def _next(self):
+        """ returns (dict): the highest priority queued job, first in queue order among equals """
+        queued = [job for job in self.jobs if job['state'] == 'queued']
+        if len(queued) == 0:
+            return None
+        return max(queued, key=lambda job: (job['priority'], -self.jobs.index(job)))
+
+    def _start(self, job: dict) -> None:
+        downloader = ChapterListDownloader()
+        downloader.manga_name = job['name']
+        downloader.compile_jpg = job['compile_jpg']
+        downloader.compile_pdf = job['compile_pdf']
+        downloader.keep_originals = job['keep_originals']
+        downloader.journal = self.journal(job['id'])
+
+        # a job that ran before continues from what its journal has left
+        state = downloader.journal.compact()
+        if state is not None:
+            _, downloader.chapter_list, downloader.completed_pages = state
+        else:
+            downloader.chapter_list = job['list']
+
+        job['state'] = 'running'
+        self._running[job['id']] = downloader
+        self._save()
+
+        thread = threading.Thread(target=self._run_job, args=(job['id'], downloader), daemon=True)
+        thread.start()
+        self._changed()
+
+    def _run_job(self, job_id: str, downloader: ChapterListDownloader) -> None:
+        self.job_started.emit(job_id, downloader)
+
+        completed = False
+        try:
+            completed = downloader.download()
+        finally:
+            with self._lock:
+                del self._running[job_id]
+
+                job = self.get(job_id)
+                if completed and job is not None:
+                    self.jobs.remove(job)
+                elif job is None:
+                    downloader.journal.remove()  # cancelled
+                elif job['state'] == 'running':
+                    job['state'] = 'paused'  # failed, keep it for a retry
+                self._save()
+
+            self.job_finished.emit(job_id, completed)
+            self._changed()
+
+    def _changed(self) -> None:
+        self._wakeup.set()
+        self.changed.emit()
+
+    def _load(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+
+        with open(self.path, 'r') as f:
+            jobs = json.load(f)
+
+        # jobs that were running when the app closed are queued again
+        for job in jobs:
+            if job['state'] == 'running':
+                job['state'] = 'queued'
+        return jobs
+
+    def _save(self) -> None:
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.jobs, f)
+        os.replace(temp, self.path)
@@ -1,26 +1,37 @@
-import os
-import json
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from PyQt5.QtCore import *
 from bs4 import BeautifulSoup
-from requests.exceptions import InvalidURL, InvalidSchema, MissingSchema
+from requests.exceptions import RequestException
 
+from modules.cancel import CancelToken, Cancelled
+from modules.favourite_store import default_store
+from modules.limiter import limiter_for
+from modules.manga_page import MangaPage, detect_updates
 from modules.settings import Settings
+from modules.title_index import default_index
+from modules.update_results import UpdateResults
 
 
 class Favourite(QObject):
     on_maximum = pyqtSignal(int)
     on_progress = pyqtSignal(int)
+    on_loaded = pyqtSignal(dict)
     finished = pyqtSignal()
 
     def __init__(self):
         super(Favourite, self).__init__()
 
         self.loaded = []
+        self.token = CancelToken()
 
     def load(self):
+        """
+        Checks every favourite for new chapters, a few at a time, each emitted with on_loaded as it resolves
 
+        Cancelling (token) aborts the checks in flight, the results are only saved for a complete check
+        """
+        token = self.token
         data = Favourite.load_favourites()
 
         # if no data exit
@@ -32,30 +43,70 @@ class Favourite(QObject):
         self.loaded.clear()
 
         count = 0
-        for _slice in data:
-
-            url = _slice['manga']['url']
-            r = requests.get(url)
-            soup = BeautifulSoup(r.content, 'html.parser')
-
-            last_chapter_recorded = _slice['lastChapter']['name']
-            updated_names, updated_urls = Favourite.get_updated_chapters(url, soup=soup,
-                                                                         last_recorded_url=_slice['lastChapter']['url'])
+        with ThreadPoolExecutor(max_workers=Settings.favourite_workers) as executor:
+            futures = [executor.submit(Favourite.check, _slice, token) for _slice in data]
+            try:
+                for future in as_completed(futures):
+                    loaded = future.result()
+                    token.raise_if_cancelled()
+
+                    self.loaded.append(loaded)
+                    self.on_loaded.emit(loaded)
+                    count += 1
+                    self.on_progress.emit(count)
+            except Cancelled:
+                for future in futures:
+                    future.cancel()
+                self.finished.emit()
+                return
+
+        UpdateResults().save(self.loaded)
+        default_index.add([{'title': loaded['title'], 'url': loaded['url']}
+                           for loaded in self.loaded if loaded['status'] != 'Failed'], 'favourite')
+        self.finished.emit()
 
-            self.loaded.append({
-                'title': self.get_name(_slice['manga']['url'], soup),
+    @staticmethod
+    def check(_slice: dict, token: CancelToken = None) -> dict:
+        """
+        _slice (dict): favourite entry
+        token (CancelToken): aborts the check, raising Cancelled
+
+        returns (dict): {'title', 'url', 'chapter', 'status', 'updates', 'chapters'} of the entry
+                        chapters are the new chapters [{'name', 'href'}], newest first
+        """
+        url = _slice['manga']['url']
+        last_chapter_recorded = _slice['lastChapter']['name']
+
+        try:
+            # only read until the recorded chapter shows up
+            with limiter_for(url).slot() as slot:
+                if token is not None:
+                    token.raise_if_cancelled()
+                title, updated_names, updated_urls = detect_updates(url, _slice['lastChapter']['url'], slot, token)
+        except (RequestException, AttributeError):
+            # unreachable or not a manga page anymore, the other favourites still load
+            return {
+                'title': url,
                 'url': url,
                 'chapter': last_chapter_recorded,
-                'status': 'No updates' if len(updated_names) <= 0 else f'{len(updated_names)}'
-            })
-            count += 1
-            self.on_progress.emit(count)
-
-        self.finished.emit()
+                'status': 'Failed',
+                'updates': 0,
+                'chapters': []
+            }
+
+        return {
+            'title': title,
+            'url': url,
+            'chapter': last_chapter_recorded,
+            'status': 'No updates' if len(updated_names) <= 0 else f'{len(updated_names)}',
+            'updates': len(updated_names),
+            'chapters': [{'name': name, 'href': href} for name, href in zip(updated_names, updated_urls)]
+        }
 
     @staticmethod
-    def get_updated_chapters(url: str, *, soup: BeautifulSoup = None, last_recorded_url: str = None) -> tuple:
-        """ Get tuple (names, links) of updated chapters """
+    def get_updated_chapters(url: str, *, soup: BeautifulSoup = None, last_recorded_url: str = None,
+                             page: MangaPage = None) -> tuple:
+        """ Get tuple (names, links) of updated chapters, (page) or (soup) avoid fetching it again """
         if last_recorded_url is not None and type(last_recorded_url) != str:
             raise TypeError("'last_recorded' must be of type str")
         if type(url) != str:
@@ -63,72 +114,43 @@ class Favourite(QObject):
 
         # if last chapter is None get the last chapter
         if last_recorded_url is None:
-            data = Favourite.load_favourites()
+            entry = Favourite.get_entry(url)
 
-            # if no data exit
-            if data is None:
-                return tuple()
-
-            for piece in data:
-                if piece['manga']['url'] == url:
-                    last_recorded_url = piece['lastChapter']['url']
-                    break
-
-        if soup is not None:
-            if type(soup) != BeautifulSoup:
-                raise TypeError("'soup' must be of type Beautiful soup")
-        else:
-            r = None
-            try:
-                r = requests.get(url)
-            except InvalidURL or InvalidSchema or MissingSchema:
+            # if not a favourite exit
+            if entry is None:
                 return tuple()
-            soup = BeautifulSoup(r.content, 'html.parser')
 
-        rows = soup.find_all(class_="chapter-list")[0].find_all(class_="row")
+            last_recorded_url = entry['lastChapter']['url']
 
-        names = []
-        updated = []
-        for row in rows:
-            href = row.find('a', href=True)['href']
-            if href == last_recorded_url:
-                break
+        if page is None:
+            if soup is not None:
+                if type(soup) != BeautifulSoup:
+                    raise TypeError("'soup' must be of type Beautiful soup")
+                page = MangaPage(url, soup)
             else:
-                names.append(row.find('a', href=True).text)
-                updated.append(href)
+                try:
+                    return detect_updates(url, last_recorded_url)[1:]
+                except (RequestException, AttributeError):
+                    return tuple()
 
-        return names, updated
+        return page.updated_since(last_recorded_url)
 
     @staticmethod
     def load_favourites() -> list:
         """ Load favourites from json to list """
-        # if favourites doesnt exist
-        if not os.path.exists(Settings.favourite_data_file):
-            return list()
-
-        # load data
-        data = None
-        with open(Settings.favourite_data_file, 'r') as f:
-            data = json.load(f)
-
-        return data
+        return default_store.all()
 
     @staticmethod
-    def is_favourite(url: str) -> bool:
+    def get_entry(url: str):
+        """ returns (dict): the favourite entry of (url) or None if it is not a favourite """
         if type(url) != str:
             raise TypeError("'url' must be of type str")
 
-        data = Favourite.load_favourites()
+        return default_store.get(url)
 
-        # if no data exit
-        if data is None:
-            return False
-
-        for piece in data:
-            if piece['manga']['url'] == url:
-                return True
-
-        return False
+    @staticmethod
+    def is_favourite(url: str) -> bool:
+        return Favourite.get_entry(url) is not None
 
     def get_name(self, url, soup: BeautifulSoup = None):
         """ Get name from url """
@@ -136,12 +158,9 @@ class Favourite(QObject):
         if soup is not None:
             if type(soup) != BeautifulSoup:
                 raise TypeError("'soup' must be of type Beautiful soup")
-        else:
-            r = None
-            try:
-                r = requests.get(url)
-            except InvalidURL or InvalidSchema or MissingSchema:
-                return list()
-            soup = BeautifulSoup(r.content, 'html.parser')
+            return MangaPage(url, soup).title
 
-        return soup.find(class_="manga-info-text").find("h1").text
+        try:
+            return MangaPage.load(url).title
+        except (RequestException, AttributeError):
+            return list()
@@ -0,0 +1,188 @@
+import os
+import copy
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from modules.manga_page import MangaPage
+from modules.settings import Settings
+
+
+class FavouriteStore(object):
+    """
+    Favourites kept in fave.json, indexed by manga url in memory
+
+    Entries keep the format of the Kfave.jar tool that used to manage the file
+    {'manga': {'url'}, 'lastChapter': {'name', 'url'}}
+
+    The file is only read again when another process changed it, every write atomically replaces it.
+    The loader, favourites and download threads share default_store
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path if path is not None else Settings.favourite_data_file
+
+        self._lock = threading.RLock()
+        self._entries = {}  # url: entry, in file order
+        self._stamp = None  # (mtime, size) of the file the entries were read from
+        self._batch = 0
+        self._dirty = False
+
+    def all(self) -> list:
+        """ returns (list): every favourite entry, empty if there is no data file yet """
+        with self._lock:
+            self._sync()
+            return copy.deepcopy(list(self._entries.values()))
+
+    def get(self, url: str):
+        """ returns (dict): the entry of (url) or None if it is not a favourite """
+        with self._lock:
+            self._sync()
+            entry = self._entries.get(url)
+            return copy.deepcopy(entry) if entry is not None else None
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            self._sync()
+            return url in self._entries
+
+    @contextmanager
+    def batch(self):
+        """ Updates made inside are written to the file once, when the outermost batch ends """
+        with self._lock:
+            self._batch += 1
+            try:
+                yield self
+            finally:
+                self._batch -= 1
+                if self._batch == 0 and self._dirty:
+                    self._save()
+
+    def add(self, url: str, last_chapter: dict = None) -> dict:
+        """
+        url (str): manga page url
+        last_chapter (dict): {'name', 'href'} of the newest chapter read, the newest chapter listed online if None
+
+        Adds (url) or moves its last chapter forward, returns the entry
+        """
+        if last_chapter is None:
+            last_chapter = MangaPage.load(url, max_age=0).chapters[0]
+
+        return self.add_many([(url, last_chapter)])[0]
+
+    def add_many(self, favourites: list) -> list:
+        """ Adds or updates [(url, last_chapter)] with a single write, returns the entries """
+        with self.batch():
+            self._sync()
+
+            entries = []
+            for url, last_chapter in favourites:
+                entry = self._entries.setdefault(url, {'manga': {'url': url}})
+                entry['lastChapter'] = {'name': last_chapter['name'], 'url': last_chapter['href']}
+                entries.append(copy.deepcopy(entry))
+
+            self._dirty = True
+            return entries
+
+    def update_last_chapter(self, url: str, name: str, href: str) -> bool:
+        """ returns (bool): False if (url) is not a favourite """
+        with self.batch():
+            if url not in self:
+                return False
+
+            self.add_many([(url, {'name': name, 'href': href})])
+            return True
+
+    def remove(self, *urls: str) -> int:
+        """ returns (int): amount of favourites removed """
+        with self.batch():
+            self._sync()
+
+            removed = 0
+            for url in urls:
+                if self._entries.pop(url, None) is not None:
+                    removed += 1
+
+            self._dirty = self._dirty or removed > 0
+            return removed
+
+    def import_urls(self, urls: list) -> list:
+        """ Adds every url in (urls) at its newest chapter, pages are fetched a few at a time """
+        with ThreadPoolExecutor(max_workers=Settings.favourite_workers) as executor:
+            pages = list(executor.map(lambda url: MangaPage.load(url, max_age=0), urls))
+
+        return self.add_many([(page.url, page.chapters[0]) for page in pages])
+
+    def migrate(self) -> int:
+        """
+        Rewrites a data file left by Kfave.jar, dropping entries without a url and duplicates
+
+        returns (int): amount of entries dropped
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                return 0
+
+            data = self._read()
+            self._stamp = None
+            self._sync()
+            changed = len(data) != len(self._entries)
+            for entry in self._entries.values():
+                last = entry.get('lastChapter') or {}
+                normalised = {'name': last.get('name', ''), 'url': last.get('url', '')}
+                if entry.get('lastChapter') != normalised:
+                    entry['lastChapter'] = normalised
+                    changed = True
+
+            # an already migrated file is left alone, this runs on every start
+            if changed:
+                self._save()
+            return len(data) - len(self._entries)
+
+    def _sync(self) -> None:
+        """ Reads the file again if it changed since it was last read or written, call with the lock held """
+        if self._dirty:
+            return  # changes of the running batch are written over the file
+
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+
+        self._entries = {}
+        for entry in self._read():
+            url = entry.get('manga', {}).get('url')
+            if url is not None and url not in self._entries:
+                self._entries[url] = entry
+        self._stamp = stamp
+
+    def _read(self) -> list:
+        if not os.path.exists(self.path):
+            return list()
+
+        with open(self.path, 'r') as f:
+            text = f.read()
+
+        # the jar wrapper created an empty file before its first write
+        if text.strip() == '':
+            return list()
+        return json.loads(text)
+
+    def _save(self) -> None:
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(list(self._entries.values()), f)
+        os.replace(temp, self.path)
+
+        self._stamp = self._file_stamp()
+        self._dirty = False
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+default_store = FavouriteStore()
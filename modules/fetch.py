@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+
+import requests
+from requests.exceptions import ConnectionError, Timeout
+
+from modules import session
+from modules.cancel import CancelToken
+from modules.limiter import limiter_for
+from modules.settings import Settings
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class LatencyTracker(object):
+    """ Keeps the latest response latencies of every host """
+
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def add(self, host: str, latency: float) -> None:
+        with self._lock:
+            self._samples.setdefault(host, deque(maxlen=self.size)).append(latency)
+
+    def percentile(self, host: str, percent: float):
+        """ returns (float): the (percent) percentile latency of (host) or None without enough samples """
+        with self._lock:
+            samples = sorted(self._samples.get(host, ()))
+
+        if len(samples) < Settings.hedge_min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+class FetchPolicy(object):
+    """
+    Deadlines, jittered exponential retries and optional hedging for GET requests
+
+    A hedged request sends a duplicate once the first has taken longer than the hosts p95 latency,
+    whichever responds first is returned and the other is closed
+    """
+
+    latencies = LatencyTracker()
+    _hedge_executor = ThreadPoolExecutor(max_workers=Settings.hedge_workers)
+
+    def __init__(self, connect_timeout: float = None, read_timeout: float = None, retries: int = None,
+                 backoff: float = None, max_backoff: float = None):
+        self.connect_timeout = connect_timeout if connect_timeout is not None else Settings.http_timeout[0]
+        self.read_timeout = read_timeout if read_timeout is not None else Settings.http_timeout[1]
+        self.retries = retries if retries is not None else Settings.fetch_retries
+        self.backoff = backoff if backoff is not None else Settings.fetch_backoff
+        self.max_backoff = max_backoff if max_backoff is not None else Settings.fetch_max_backoff
+
+    def get(self, url: str, *, hedge: bool = False, slot=None, token: CancelToken = None,
+            **kwargs) -> requests.Response:
+        """
+        url (str): url to get
+        hedge (bool): send a duplicate request when this one is slower than the hosts p95
+        slot (HostSlot): host limiter slot the request is made in, failed attempts back it off
+        token (CancelToken): aborts the request, its body and retries, raising Cancelled
+
+        returns (Response): the first response that is not a retryable status, or the last one
+
+        Raises the last connection error or timeout once retries run out
+        """
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+
+        # the body is read here under the token so cancel can cut it off
+        read = token is not None and not kwargs.get('stream', False)
+        if read:
+            kwargs['stream'] = True
+
+        for attempt in range(self.retries + 1):
+            if token is not None:
+                token.raise_if_cancelled()
+
+            last = attempt == self.retries
+            try:
+                response = self._hedged(url, **kwargs) if hedge else self._timed(url, **kwargs)
+            except (ConnectionError, Timeout):
+                if slot is not None:
+                    slot.limiter.back_off()
+                if token is not None:
+                    token.raise_if_cancelled()
+                if last:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or last:
+                    if slot is not None:
+                        slot.record(response)
+                    if read:
+                        self._read(response, token)
+                    return response
+
+                if slot is not None:
+                    slot.limiter.back_off()
+                response.close()
+
+            if token is not None:
+                token.wait(self.delay(attempt))
+            else:
+                time.sleep(self.delay(attempt))
+
+    def delay(self, attempt: int) -> float:
+        """ returns (float): seconds to wait before retry (attempt), full jitter over an exponential cap """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def _read(response: requests.Response, token: CancelToken) -> None:
+        try:
+            with token.reading(response):
+                response.content
+        except Exception:
+            response.close()
+            raise
+
+    def _timed(self, url: str, **kwargs) -> requests.Response:
+        start = time.monotonic()
+        response = session.get(url, **kwargs)
+        FetchPolicy.latencies.add(urlparse(url).netloc, time.monotonic() - start)
+        return response
+
+    def _slotted(self, slot, url: str, **kwargs) -> requests.Response:
+        with slot:
+            response = self._timed(url, **kwargs)
+            slot.record(response)
+        return response
+
+    def _hedged(self, url: str, **kwargs) -> requests.Response:
+        p95 = FetchPolicy.latencies.percentile(urlparse(url).netloc, 95)
+        if p95 is None:
+            return self._timed(url, **kwargs)
+
+        primary = FetchPolicy._hedge_executor.submit(self._timed, url, **kwargs)
+        done, _ = wait([primary], timeout=p95)
+        if done:
+            return primary.result()
+
+        # the duplicate counts against the host like any request, without a free slot the first one is awaited
+        slot = limiter_for(url).try_slot()
+        if slot is None:
+            return primary.result()
+
+        pending = {primary, FetchPolicy._hedge_executor.submit(self._slotted, slot, url, **kwargs)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = None
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                elif winner is None:
+                    winner = future
+                else:
+                    future.result().close()
+
+            if winner is not None:
+                for future in pending:
+                    future.add_done_callback(_close_discarded)
+                return winner.result()
+
+        raise error
+
+
+def _close_discarded(future) -> None:
+    if future.exception() is None:
+        future.result().close()
+
+
+default_policy = FetchPolicy()
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """ GET (url) with the default fetch policy """
+    return default_policy.get(url, **kwargs)
@@ -0,0 +1,178 @@
+import os
+import json
+import hashlib
+import threading
+import time
+
+from modules import fetch
+from modules.settings import Settings
+
+
+class CachedResponse(object):
+    """ The parts of a response the page loaders use, served from the network or the cache """
+
+    def __init__(self, url: str, status_code: int, content: bytes, from_cache: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+
+
+class HttpCache(object):
+    """
+    On disk cache of page responses keyed by url
+
+    A fresh entry is served without a request, a stale one is revalidated with
+    If-None-Match / If-Modified-Since so an unchanged page only costs a 304.
+    Least recently used entries are evicted once the bodies pass (max_bytes)
+    """
+
+    def __init__(self, path: str = None, ttl: float = None, max_bytes: int = None):
+        self.path = path if path is not None else Settings.http_cache_path
+        self.ttl = ttl if ttl is not None else Settings.http_cache_ttl
+        self.max_bytes = max_bytes if max_bytes is not None else Settings.http_cache_size
+
+        self._lock = threading.Lock()
+        self._index = None  # key: {'url', 'etag', 'last_modified', 'stored', 'accessed', 'size'}
+
+    def get(self, url: str, *, max_age: float = None, **kwargs) -> CachedResponse:
+        """
+        url (str): url to get
+        max_age (float): seconds an entry is served without revalidation, defaults to the ttl
+                         0 always revalidates
+
+        returns (CachedResponse): cached or fresh response
+        """
+        max_age = max_age if max_age is not None else self.ttl
+        key = self.key(url)
+
+        with self._lock:
+            entry = self._entries().get(key)
+            if entry is not None:
+                entry = dict(entry)
+
+        body = self._read_body(key) if entry is not None else None
+        if body is not None and time.time() - entry['stored'] < max_age:
+            self._touch(key)
+            return CachedResponse(url, 200, body, from_cache=True)
+
+        headers = kwargs.pop('headers', {})
+        if body is not None:
+            if entry['etag'] is not None:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified'] is not None:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = fetch.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and body is not None:
+            self._touch(key, revalidated=True)
+            return CachedResponse(url, 200, body, from_cache=True)
+
+        if response.status_code == 200 and self._storable(response):
+            self._store(key, url, response)
+
+        return CachedResponse(url, response.status_code, response.content)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries()):
+                self._remove(key)
+            self._save_index()
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _storable(self, response) -> bool:
+        if 'no-store' in response.headers.get('cache-control', ''):
+            return False
+        return len(response.content) <= self.max_bytes
+
+    def _store(self, key: str, url: str, response) -> None:
+        content = response.content
+        now = time.time()
+
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+
+            temp = self._body_path(key) + '.tmp'
+            with open(temp, 'wb') as f:
+                f.write(content)
+            os.replace(temp, self._body_path(key))
+
+            self._entries()[key] = {
+                'url': url,
+                'etag': response.headers.get('etag'),
+                'last_modified': response.headers.get('last-modified'),
+                'stored': now,
+                'accessed': now,
+                'size': len(content)
+            }
+            self._evict()
+            self._save_index()
+
+    def _touch(self, key: str, revalidated: bool = False) -> None:
+        with self._lock:
+            entry = self._entries().get(key)
+            if entry is None:
+                return
+
+            entry['accessed'] = time.time()
+            if revalidated:
+                entry['stored'] = entry['accessed']
+
+            # saved for fresh hits too, eviction order has to survive a restart
+            self._save_index()
+
+    def _evict(self) -> None:
+        entries = self._entries()
+        total = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['accessed']):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]['size']
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        self._entries().pop(key, None)
+        try:
+            os.remove(self._body_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _read_body(self, key: str):
+        try:
+            with open(self._body_path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.path, key)
+
+    def _entries(self) -> dict:
+        """ Index of the cache, loaded on first use, call with the lock held """
+        if self._index is None:
+            try:
+                with open(os.path.join(self.path, 'index.json'), 'r') as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+        index_path = os.path.join(self.path, 'index.json')
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(self._index, f)
+        os.replace(index_path + '.tmp', index_path)
+
+
+default_cache = HttpCache()
+
+
+def get(url: str, **kwargs) -> CachedResponse:
+    """ GET (url) through the default cache """
+    return default_cache.get(url, **kwargs)
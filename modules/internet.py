@@ -1,11 +1,86 @@
-from http import client
-
-def have_internet():
-    conn = client.HTTPConnection('www.google.com', timeout=5)
-    try:
-        conn.request('HEAD', '/')
-        conn.close()
-        return True
-    except:
-        conn.close()
-        return False
\ No newline at end of file
+import threading
+import time
+
+from PyQt5.QtCore import *
+from requests.exceptions import RequestException
+
+from modules import session
+from modules.settings import Settings
+
+
+class ConnectivityMonitor(QObject):
+    """
+    Probes the manga source in the background and keeps whether it was reachable
+
+    Reading the state never touches the network, changed is emitted when it flips
+    """
+
+    changed = pyqtSignal(bool)
+
+    def __init__(self, url: str = None, ttl: float = None, timeout: float = None):
+        """
+        url (str): url probed with a HEAD request, any response counts as online
+        ttl (float): seconds a probe result is trusted
+        timeout (float): seconds a probe waits for a response
+        """
+        super().__init__()
+
+        self.url = url if url is not None else Settings.mangakakalot_home
+        self.ttl = ttl if ttl is not None else Settings.connectivity_ttl
+        self.timeout = timeout if timeout is not None else Settings.connectivity_timeout
+
+        # assumed online until the first probe says otherwise
+        self.online = True
+        self.checked = None
+
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """ Starts probing every ttl seconds on a background thread """
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def is_online(self) -> bool:
+        """ returns (bool): the last probe result, a stale or offline result asks for a new probe """
+        if not self.online or self.checked is None or time.monotonic() - self.checked > self.ttl:
+            self.refresh()
+        return self.online
+
+    def refresh(self) -> None:
+        """ Probes again without waiting for the ttl """
+        self.start()
+        self._wakeup.set()
+
+    def probe(self) -> bool:
+        """ returns (bool): True if the source responded, blocks up to timeout """
+        try:
+            session.head(self.url, timeout=self.timeout, allow_redirects=False).close()
+            online = True
+        except RequestException:
+            online = False
+
+        self.checked = time.monotonic()
+        if online != self.online:
+            self.online = online
+            self.changed.emit(online)
+        return online
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            self.probe()
+            self._wakeup.wait(self.ttl)
+
+
+monitor = ConnectivityMonitor()
+
+
+def have_internet() -> bool:
+    """ returns (bool): whether the manga source was reachable at the last probe, never blocks """
+    return monitor.is_online()
@@ -0,0 +1,158 @@
+import os
+import json
+import threading
+
+from modules.settings import Settings
+
+
+class DownloadJournal(object):
+    """
+    Append only log of a download task, one json event per line
+
+    {'event': 'task', 'name': manga name, 'list': chapter list}
+    {'event': 'page', 'chapter': chapter href, 'page': page url, 'size': bytes on disk}
+    {'event': 'chapter', 'chapter': chapter href}
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path if path is not None else os.path.join(Settings.manga_save_path, Settings.download_journal)
+
+        self._lock = threading.Lock()
+        self._file = None
+
+    def start(self, manga_name: str, chapter_list: list, pages: dict = None) -> None:
+        """
+        manga_name (str): name of the manga being downloaded
+        chapter_list (list): chapters left to download
+        pages (dict): {chapter href: {page url: size}} pages already on disk
+
+        Starts a new journal, replacing any previous one
+        """
+        with self._lock:
+            self._close()
+            if not os.path.exists(os.path.dirname(self.path) or '.'):
+                os.makedirs(os.path.dirname(self.path))
+            self._write_state(self.path, manga_name, chapter_list, pages or {})
+            self._file = open(self.path, 'a')
+
+    def page_done(self, chapter_href: str, page_url: str, size: int) -> None:
+        self._append({'event': 'page', 'chapter': chapter_href, 'page': page_url, 'size': size})
+
+    def chapter_done(self, chapter_href: str) -> None:
+        self._append({'event': 'chapter', 'chapter': chapter_href})
+
+    def close(self) -> None:
+        """ Closes the journal keeping it on disk to be resumed """
+        with self._lock:
+            self._close()
+
+    def remove(self) -> None:
+        """ Closes and removes the journal, once the task is complete or abandoned """
+        with self._lock:
+            self._close()
+            self._remove()
+
+    def compact(self):
+        """
+        returns (tuple): (manga name, remaining chapter list, {chapter href: {page url: size}})
+                         or None if there is nothing to resume
+
+        Rebuilds the remaining work from the journal and rewrites it as a single task event
+        followed by the page events of the remaining chapters
+        A legacy dlog.json is migrated here
+        """
+        with self._lock:
+            self._close()
+
+            state = self._read()
+            if state is None:
+                return None
+
+            legacy = os.path.join(os.path.dirname(self.path), Settings.download_log)
+            manga_name, chapter_list, pages = state
+            if len(chapter_list) == 0:
+                self._remove()
+            else:
+                temp = self.path + '.tmp'
+                self._write_state(temp, manga_name, chapter_list, pages)
+                os.replace(temp, self.path)
+
+            if os.path.exists(legacy):
+                os.remove(legacy)
+
+            return state if len(chapter_list) > 0 else None
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return self._read_legacy()
+
+        manga_name = None
+        chapter_list = []
+        finished = set()
+        pages = {}
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # torn write from an interrupted task
+
+                if event['event'] == 'task':
+                    manga_name = event['name']
+                    chapter_list = event['list']
+                elif event['event'] == 'page':
+                    pages.setdefault(event['chapter'], {})[event['page']] = event['size']
+                elif event['event'] == 'chapter':
+                    finished.add(event['chapter'])
+
+        if manga_name is None:
+            return None
+
+        remaining = [chapter for chapter in chapter_list if chapter['href'] not in finished]
+        hrefs = {chapter['href'] for chapter in remaining}
+        pages = {href: done for href, done in pages.items() if href in hrefs}
+
+        return manga_name, remaining, pages
+
+    def _read_legacy(self):
+        """ Reads the whole list dlog.json written by earlier versions """
+        legacy = os.path.join(os.path.dirname(self.path), Settings.download_log)
+        if not os.path.exists(legacy):
+            return None
+
+        with open(legacy, 'r') as dlog:
+            data = json.load(dlog)
+
+        chapter_list = data['list']
+        if type(chapter_list) == dict:
+            chapter_list = [chapter_list]
+        elif type(chapter_list) != list:
+            os.remove(legacy)
+            return None
+
+        return data['name'], chapter_list, {}
+
+    @staticmethod
+    def _write_state(path: str, manga_name: str, chapter_list: list, pages: dict) -> None:
+        with open(path, 'w') as f:
+            f.write(json.dumps({'event': 'task', 'name': manga_name, 'list': chapter_list}) + '\n')
+            for chapter_href, done in pages.items():
+                for page_url, size in done.items():
+                    f.write(json.dumps({'event': 'page', 'chapter': chapter_href, 'page': page_url, 'size': size}) + '\n')
+
+    def _append(self, event: dict) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+
+            self._file.write(json.dumps(event) + '\n')
+            self._file.flush()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
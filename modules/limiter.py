@@ -0,0 +1,220 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+from requests.exceptions import RequestException
+
+from modules.settings import Settings
+
+_limiters = {}
+_listeners = []
+_registry_lock = threading.Lock()
+
+
+class HostLimiter(object):
+    """
+    Limits requests to a single host by rate (requests per second) and by requests in flight
+
+    In adaptive mode the in flight limit grows by one after a full window of healthy responses
+    and is halved (as is the rate) on 429/5xx responses and connection errors or timeouts
+    """
+
+    def __init__(self, host: str, rate: float = 0, max_in_flight: int = 4, adaptive: bool = False):
+        self.host = host
+        self.rate = rate  # 0 is unlimited
+        self.max_in_flight = max_in_flight
+        self.adaptive = adaptive
+
+        self.ceiling = max(max_in_flight, Settings.limiter_ceiling)
+        self.max_rate = rate
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._tokens = 1.0
+        self._refilled = time.monotonic()
+
+        self._successes = 0
+        self._latency = None  # moving average of healthy responses
+        self._baseline = None  # lowest moving average seen
+        self._backed_off = 0.0
+
+    def slot(self):
+        """
+        returns (HostSlot): context manager holding one request slot of this host
+
+        Record the response with HostSlot.record, exceptions raised by requests count as failures
+        """
+        return HostSlot(self)
+
+    def try_slot(self):
+        """ returns (HostSlot): a slot already held, released by leaving it as a context manager, or None if none is free """
+        if not self.try_acquire():
+            return None
+        return HostSlot(self, held=True)
+
+    def try_acquire(self) -> bool:
+        """ returns (bool): True if a slot was taken without waiting """
+        with self._condition:
+            self._refill()
+            if self._in_flight < self.max_in_flight and (self.rate <= 0 or self._tokens >= 1):
+                self._take()
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._condition:
+            while True:
+                self._refill()
+                if self._in_flight < self.max_in_flight and (self.rate <= 0 or self._tokens >= 1):
+                    break
+
+                timeout = None
+                if self._in_flight < self.max_in_flight:
+                    timeout = (1 - self._tokens) / self.rate  # waiting on the rate only
+                self._condition.wait(timeout)
+
+            self._take()
+
+    def _take(self) -> None:
+        """ Takes a slot, call with the condition held """
+        self._in_flight += 1
+        if self.rate > 0:
+            self._tokens -= 1
+
+    def release(self, latency: float, status: int = None, error: bool = False) -> None:
+        """
+        latency (float): seconds until the response arrived
+        status (int): http status of the response
+        error (bool): the request failed without a response
+        """
+        changed = False
+        with self._condition:
+            self._in_flight -= 1
+
+            if self.adaptive:
+                if error or status == 429 or (status is not None and status >= 500):
+                    changed = self._decrease()
+                else:
+                    changed = self._increase(latency)
+
+            self._condition.notify_all()
+
+        if changed:
+            _notify(self)
+
+    def back_off(self) -> None:
+        """ Backs an adaptive limiter off without releasing a slot, for failed attempts that are retried """
+        if not self.adaptive:
+            return
+
+        with self._condition:
+            changed = self._decrease()
+
+        if changed:
+            _notify(self)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _increase(self, latency: float) -> bool:
+        self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+        self._baseline = self._latency if self._baseline is None else min(self._baseline, self._latency)
+
+        # hold while latency climbs above the best observed
+        if self._latency > self._baseline * Settings.limiter_latency_tolerance:
+            self._successes = 0
+            return False
+
+        self._successes += 1
+        if self._successes < self.max_in_flight:
+            return False
+        self._successes = 0
+
+        changed = False
+        if self.max_in_flight < self.ceiling:
+            self.max_in_flight += 1
+            changed = True
+        if 0 < self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + 1)
+            changed = True
+        return changed
+
+    def _decrease(self) -> bool:
+        # one back off per window, concurrent failures of the same burst count once
+        now = time.monotonic()
+        if now - self._backed_off < max(1.0, self._latency or 0):
+            return False
+        self._backed_off = now
+        self._successes = 0
+
+        self.max_in_flight = max(1, self.max_in_flight // 2)
+        if self.rate > 0:
+            self.rate = max(Settings.limiter_min_rate, self.rate / 2)
+        return True
+
+
+class HostSlot(object):
+
+    def __init__(self, limiter: HostLimiter, held: bool = False):
+        """ held (bool): the slot was already acquired, entering does not wait for it """
+        self.limiter = limiter
+        self.status = None
+        self.latency = None
+        self._held = held
+        self._start = time.monotonic() if held else None
+
+    def record(self, response) -> None:
+        """ Records the status and time to response of (response) """
+        self.status = response.status_code
+        self.latency = time.monotonic() - self._start
+
+    def __enter__(self):
+        if not self._held:
+            self.limiter.acquire()
+            self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        latency = self.latency if self.latency is not None else time.monotonic() - self._start
+        error = exc_type is not None and issubclass(exc_type, RequestException)
+        self.limiter.release(latency, self.status, error)
+        return False
+
+
+def limiter_for(url: str) -> HostLimiter:
+    """
+    url (str): url that will be requested
+
+    returns (HostLimiter): the limiter of the urls host, created with the settings defaults
+    """
+    host = urlparse(url).netloc
+    with _registry_lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter(host, Settings.limiter_rate, Settings.limiter_max_in_flight,
+                                          Settings.limiter_adaptive)
+        return _limiters[host]
+
+
+def add_listener(callback) -> None:
+    """
+    callback (callable): called as callback(host, max in flight, rate) whenever an adaptive limiter changes
+    """
+    with _registry_lock:
+        _listeners.append(callback)
+
+
+def remove_listener(callback) -> None:
+    with _registry_lock:
+        if callback in _listeners:
+            _listeners.remove(callback)
+
+
+def _notify(limiter: HostLimiter) -> None:
+    with _registry_lock:
+        listeners = _listeners[:]
+
+    for callback in listeners:
+        callback(limiter.host, limiter.max_in_flight, float(limiter.rate))
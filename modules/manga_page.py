@@ -0,0 +1,135 @@
+import html
+from contextlib import nullcontext
+
+from bs4 import BeautifulSoup
+
+from modules import fetch, http_cache, parser
+from modules.cancel import CancelToken
+from modules.settings import Settings
+
+
+class MangaPage(object):
+    """
+    A manga page fetched and parsed once
+
+    Title, chapter list and update detection all read the same page,
+    only the containers they need are parsed unless a whole (soup) is given
+    """
+
+    def __init__(self, url: str, soup: BeautifulSoup = None, content: bytes = None):
+        self.url = url
+        self.soup = soup
+        self.content = content
+
+        self._title = None
+        self._chapters = None
+
+    @classmethod
+    def load(cls, url: str, max_age: float = None, token: CancelToken = None):
+        """
+        url (str): manga page url
+        max_age (float): see HttpCache.get
+        token (CancelToken): aborts the request
+
+        returns (MangaPage): the parsed page
+        """
+        r = http_cache.get(url, max_age=max_age, token=token)
+        return cls(url, content=r.content)
+
+    @property
+    def title(self) -> str:
+        if self._title is None:
+            self._title = self._find(attrs={'class': 'manga-info-text'}).find("h1").text
+        return self._title
+
+    @property
+    def chapters(self) -> list:
+        """ returns (list): [{'name', 'href'}] newest chapter first, as listed on the page """
+        if self._chapters is None:
+            rows = self._find(attrs={'class': 'chapter-list'}).find_all(class_="row")
+
+            self._chapters = []
+            for row in rows:
+                link = row.find('a', href=True)
+                if link is None:
+                    continue  # row cut off at the end of a partly read page
+                self._chapters.append({
+                    'name': link.text,
+                    'href': link['href']
+                })
+        return self._chapters
+
+    def updated_since(self, last_recorded_url: str) -> tuple:
+        """ returns (tuple): (names, links) of chapters newer than (last_recorded_url) """
+        names = []
+        updated = []
+        for chapter in self.chapters:
+            if chapter['href'] == last_recorded_url:
+                break
+            names.append(chapter['name'])
+            updated.append(chapter['href'])
+
+        return names, updated
+
+    def _find(self, name: str = None, attrs: dict = None):
+        if self.soup is not None:
+            return self.soup.find(name, attrs)
+        return parser.find(self.content, name, attrs)
+
+
+def detect_updates(url: str, last_recorded_url: str, slot=None, token: CancelToken = None) -> tuple:
+    """
+    url (str): manga page url
+    last_recorded_url (str): link of the last chapter already known
+    slot (HostSlot): host limiter slot the request is made in
+    token (CancelToken): aborts the read, raising Cancelled
+
+    returns (tuple): (title, names, links) of the chapters listed before (last_recorded_url)
+
+    The page is streamed and reading stops as soon as the recorded chapter shows up in the chapter list,
+    newest chapters come first so the rest of the page is usually never downloaded
+    """
+    info = parser.ElementSlicer(attrs={'class': 'manga-info-text'})
+    chapter_list = parser.ElementSlicer(attrs={'class': 'chapter-list'})
+
+    # the quoted href, which may be written with escaped ampersands
+    needles = {quote + link.encode('utf-8') + quote
+               for link in (last_recorded_url, html.escape(last_recorded_url, quote=False))
+               for quote in (b'"', b"'")}
+    overlap = max(len(needle) for needle in needles)
+
+    content = bytearray()
+    cut = None
+    response = fetch.get(url, stream=True, slot=slot, token=token)
+    try:
+        with token.reading(response) if token is not None else nullcontext():
+            for chunk in response.iter_content(chunk_size=Settings.update_chunk_size):
+                searched = max(0, len(content) - overlap)
+                content += chunk
+
+                info.feed(chunk)
+                if chapter_list.feed(chunk):
+                    break  # the whole list was read without finding the recorded chapter
+
+                if chapter_list.start is not None and cut is None:
+                    cut = _link_start(content, needles, max(searched, chapter_list.start))
+                if cut is not None and info.done:
+                    break
+    finally:
+        response.close()
+
+    # rows before the recorded chapter are complete, the rows after it are dropped
+    if cut is not None and info.done and info.end <= cut:
+        content = content[:cut]
+
+    page = MangaPage(url, content=bytes(content))
+    names, links = page.updated_since(last_recorded_url)
+    return page.title, names, links
+
+
+def _link_start(content: bytearray, needles: set, start: int):
+    """ returns (int): offset of the tag holding the first of (needles) after (start) or None """
+    found = [index for index in (content.find(needle, start) for needle in needles) if index >= 0]
+    if len(found) == 0:
+        return None
+    return content.rfind(b'<', 0, min(found))
@@ -0,0 +1,171 @@
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.dammit import EncodingDetector
+
+from modules.settings import Settings
+
+try:
+    import lxml  # noqa: F401
+except ImportError:
+    lxml = None
+
+_TAG = re.compile(rb'<(/?)([a-zA-Z][a-zA-Z0-9]*)\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>')
+_ATTRIBUTE = re.compile(rb'([a-zA-Z_:][-a-zA-Z0-9_:.]*)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))')
+_RAW_TEXT = {tag: re.compile(rb'</' + tag, re.IGNORECASE) for tag in (b'script', b'style')}
+_VOID = {b'area', b'base', b'br', b'col', b'embed', b'hr', b'img', b'input', b'link', b'meta', b'source', b'wbr'}
+
+
+def backend() -> str:
+    """ returns (str): the configured BeautifulSoup parser, html.parser when lxml is not installed """
+    if Settings.html_parser == 'lxml' and lxml is None:
+        return 'html.parser'
+    return Settings.html_parser
+
+
+def parse(content: bytes, name: str = None, attrs: dict = None) -> BeautifulSoup:
+    """
+    content (bytes): html document
+    name (str), attrs (dict): when given only the matching elements and their subtrees are built
+
+    returns (BeautifulSoup): parsed document
+    """
+    only = SoupStrainer(name, attrs) if name is not None or attrs is not None else None
+    return BeautifulSoup(content, backend(), parse_only=only)
+
+
+def find(content: bytes, name: str = None, attrs: dict = None):
+    """
+    content (bytes): html document
+    name (str): tag name of the container, any tag if None
+    attrs (dict): attributes of the container, class matches a single class of the tag
+
+    returns (Tag): the first matching container or None, same as BeautifulSoup.find on the whole document
+
+    Only the bytes of the container are parsed when it can be sliced out of the document
+    """
+    sliced = slice_element(content, name, attrs)
+    if sliced is not None:
+        declared = EncodingDetector.find_declared_encoding(content, is_html=True)
+        element = BeautifulSoup(sliced, backend(), from_encoding=declared).find(name, attrs)
+        if element is not None:
+            return element
+
+    return parse(content, name, attrs).find(name, attrs)
+
+
+def slice_element(content: bytes, name: str = None, attrs: dict = None):
+    """ returns (bytes): the first matching element from its opening to its closing tag or None """
+    slicer = ElementSlicer(name, attrs)
+    slicer.feed(content)
+    return slicer.element()
+
+
+class ElementSlicer(object):
+    """
+    Finds the bytes of one element in a document fed to it in pieces
+
+    feed returns True once the element closed, a reader can stop there without reading the rest.
+    Comments and the contents of scripts and styles are skipped so tags written inside them are not counted
+    """
+
+    def __init__(self, name: str = None, attrs: dict = None):
+        self.name = name.encode('ascii') if name is not None else None
+        self.attrs = {key.encode('ascii'): value.encode('utf-8') for key, value in (attrs or {}).items()}
+
+        self.buffer = bytearray()
+        self.start = None
+        self.end = None
+
+        self._position = 0
+        self._tag = None
+        self._depth = 0
+
+    @property
+    def done(self) -> bool:
+        return self.end is not None
+
+    def feed(self, data: bytes) -> bool:
+        """ returns (bool): True once the element is complete """
+        if self.done:
+            return True
+
+        self.buffer += data
+        buffer = self.buffer
+        while True:
+            index = buffer.find(b'<', self._position)
+            if index < 0:
+                self._position = len(buffer)
+                return False
+
+            if buffer.startswith(b'<!--', index):
+                close = buffer.find(b'-->', index + 4)
+                if close < 0:
+                    self._position = index
+                    return False  # wait for the end of the comment
+                self._position = close + 3
+                continue
+
+            match = _TAG.match(buffer, index)
+            if match is None:
+                if buffer.find(b'>', index) < 0:
+                    self._position = index
+                    return False  # wait for the end of the tag
+                self._position = index + 1
+                continue
+
+            closing, tag, attributes = match.group(1), match.group(2).lower(), match.group(3)
+            self._position = match.end()
+
+            if not closing and tag in _RAW_TEXT:
+                close = _RAW_TEXT[tag].search(buffer, match.end())
+                if close is None:
+                    self._position = index
+                    return False  # wait for the end of the script
+                self._position = close.start()
+
+            if self.start is None:
+                if not closing and self._matches(tag, attributes):
+                    self.start = index
+                    self._tag = tag
+                    self._depth = 1
+                    if tag in _VOID or attributes.rstrip().endswith(b'/'):
+                        self.end = match.end()
+                        return True
+                continue
+
+            if tag != self._tag:
+                continue
+
+            if closing:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = match.end()
+                    return True
+            elif not attributes.rstrip().endswith(b'/'):
+                self._depth += 1
+
+    def element(self):
+        """ returns (bytes): the element or None if it was not found complete """
+        if self.end is None:
+            return None
+        return bytes(self.buffer[self.start:self.end])
+
+    def _matches(self, tag: bytes, attributes: bytes) -> bool:
+        if self.name is not None and tag != self.name:
+            return False
+
+        found = {}
+        for match in _ATTRIBUTE.finditer(attributes):
+            value = match.group(2) if match.group(2) is not None else match.group(3) if match.group(3) is not None else match.group(4)
+            found[match.group(1).lower()] = value
+
+        for key, value in self.attrs.items():
+            if key not in found:
+                return False
+            if key == b'class':
+                if value not in found[key].split() and value != found[key]:
+                    return False
+            elif found[key] != value:
+                return False
+        return True
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import deque
+
+from modules.settings import Settings
+
+
+class Throttle(object):
+    """ Tells a loop when (interval) seconds have passed since it last reported """
+
+    def __init__(self, interval: float = None):
+        self.interval = interval if interval is not None else 1 / Settings.progress_rate
+        self._last = 0.0
+
+    def ready(self) -> bool:
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return False
+        self._last = now
+        return True
+
+
+class DownloadProgress(object):
+    """
+    Progress of a download, updated by worker threads without signalling
+
+    The ui reads it with snapshot at a fixed rate instead of receiving a signal per chunk
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset(0)
+
+    def reset(self, chapters: int) -> None:
+        with self._lock:
+            self._samples = deque()
+
+            self._chapters = chapters
+            self._chapters_done = 0
+            self._chapters_resolved = 0
+            self._chapter_title = ''
+            self._chapter_pages = 0
+            self._chapter_pages_done = 0
+
+            self._pages_known = 0
+            self._pages_done = 0
+            self._page_title = ''
+            self._active = {}  # key: [received, total]
+            self._bytes = 0
+
+    def chapter_resolved(self, pages: int) -> None:
+        with self._lock:
+            self._chapters_resolved += 1
+            self._pages_known += pages
+
+    def chapter_started(self, title: str, pages: int) -> None:
+        with self._lock:
+            self._chapter_title = title
+            self._chapter_pages = pages
+            self._chapter_pages_done = 0
+
+    def chapter_finished(self) -> None:
+        with self._lock:
+            self._chapters_done += 1
+
+    def page_started(self, key: str, title: str, total: int, received: int = 0) -> None:
+        """
+        key (str): identifies the page until it finishes
+        title (str): shown as the page label
+        total (int): bytes expected, 0 if unknown
+        received (int): bytes already on disk from an earlier attempt
+        """
+        with self._lock:
+            self._page_title = title
+            self._active[key] = [received, total]
+
+    def page_received(self, key: str, amount: int) -> None:
+        with self._lock:
+            self._bytes += amount
+            if key in self._active:
+                self._active[key][0] += amount
+
+    def page_finished(self, key: str) -> None:
+        with self._lock:
+            self._active.pop(key, None)
+            self._pages_done += 1
+            self._chapter_pages_done += 1
+
+    def snapshot(self) -> dict:
+        """
+        returns (dict): {'total': (done, chapters), 'chapter': (done, pages), 'page': (received, expected),
+                         'chapter_title', 'page_title', 'bytes', 'speed' (bytes/s), 'eta' (seconds or None)}
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._samples.append((now, self._bytes, self._pages_done))
+            while len(self._samples) > 2 and now - self._samples[0][0] > Settings.progress_window:
+                self._samples.popleft()
+
+            first_time, first_bytes, first_pages = self._samples[0]
+            span = now - first_time
+            speed = (self._bytes - first_bytes) / span if span > 0 else 0.0
+            page_rate = (self._pages_done - first_pages) / span if span > 0 else 0.0
+
+            # chapters whose page list is not known yet are estimated from the ones that are
+            average = self._pages_known / self._chapters_resolved if self._chapters_resolved > 0 else 0
+            remaining = (self._pages_known - self._pages_done) + (self._chapters - self._chapters_resolved) * average
+
+            return {
+                'total': (self._chapters_done, self._chapters),
+                'chapter': (self._chapter_pages_done, self._chapter_pages),
+                'page': (sum(page[0] for page in self._active.values()),
+                         sum(page[1] for page in self._active.values())),
+                'chapter_title': self._chapter_title,
+                'page_title': self._page_title,
+                'bytes': self._bytes,
+                'speed': speed,
+                'eta': remaining / page_rate if page_rate > 0 else None
+            }
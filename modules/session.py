@@ -0,0 +1,75 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from modules.settings import Settings
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PooledSession(requests.Session):
+    """
+    requests session that applies Settings.http_timeout to every request that does not set its own
+    """
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', Settings.http_timeout)
+        return super().request(method, url, **kwargs)
+
+
+def _create_session() -> PooledSession:
+    s = PooledSession()
+
+    # one adapter per scheme, each keeps a pool of (http_pool_maxsize) keep-alive connections
+    # for up to (http_pool_connections) hosts
+    for prefix in ('http://', 'https://'):
+        s.mount(prefix, HTTPAdapter(pool_connections=Settings.http_pool_connections,
+                                    pool_maxsize=Settings.http_pool_maxsize))
+    return s
+
+
+def get_session() -> PooledSession:
+    """
+    returns (PooledSession): the process wide session, created on first use
+
+    The session is shared by every thread, connection pools are thread safe
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session()
+        return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return get_session().get(url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    return get_session().head(url, **kwargs)
+
+
+def connection_stats() -> dict:
+    """
+    returns (dict): {host: {'connections', 'requests', 'reused'}} for every pool alive in the session
+
+    connections is the amount of connections opened, requests the amount sent through them,
+    reused the amount of requests that did not need a new connection
+    """
+    stats = {}
+    adapters = {id(adapter): adapter for adapter in get_session().adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue  # evicted while iterating
+
+            host = stats.setdefault(pool.host, {'connections': 0, 'requests': 0, 'reused': 0})
+            host['connections'] += pool.num_connections
+            host['requests'] += pool.num_requests
+            host['reused'] += max(0, pool.num_requests - pool.num_connections)
+
+    return stats
@@ -10,14 +10,65 @@ class Settings:
     manga_tree_name = 'tree'
     web_files_location = 'web'
     download_log = 'dlog.json'
+    download_journal = 'dlog.jsonl'
+    download_queue_file = 'queue.json'
+    download_jobs_path = 'jobs'
+    update_results_file = 'updates.json'
+    partial_extension = '.part'
     mangakakalot_home = 'https://mangakakalot.com'
     web_keybinding = 'keybinding.js'
+    html_parser = 'lxml'  # falls back to html.parser when lxml is not installed
 
-    kfave_path = 'Kfave.jar'
+    page_download_workers = 16  # upper bound, the host limiter decides how many run at once
+    pipeline_queue_size = 2
+    download_budget = 16  # pages in flight across all downloads
+    progress_rate = 20  # progress snapshots per second
+    progress_window = 5  # seconds of history behind speed and eta
+    stream_buffer_size = 64 * 1024  # bytes read from the socket at a time
+    stream_buffers = 4  # buffers a page may have waiting on the disk writer
+    concurrent_jobs = 2
+    favourite_workers = 8  # favourites checked for updates at once
+    search_workers = 4  # search result pages fetched at once
+    thumbnail_workers = 6  # popular page covers fetched at once
+    search_as_you_type = True
+    search_debounce = 400  # milliseconds typing has to pause before searching
+    daemon_interval = 60 * 60  # seconds between update checks of the daemon
+    daemon_jitter = 0.1
+
+    http_pool_connections = 10
+    http_pool_maxsize = 16
+    http_timeout = (5, 30)  # connect, read
+
+    connectivity_ttl = 30  # seconds a connectivity probe is trusted
+    connectivity_timeout = 5
+
+    fetch_retries = 3
+    fetch_backoff = 0.5
+    fetch_max_backoff = 8
+    hedge_min_samples = 20
+    hedge_workers = 32
+
+    limiter_rate = 0  # requests per second per host, 0 is unlimited
+    limiter_max_in_flight = 4
+    limiter_adaptive = True
+    limiter_ceiling = 16
+    limiter_min_rate = 0.5
+    limiter_latency_tolerance = 2.0
 
     manga_data_file = os.path.join(web_files_location, 'data.json')
     favourite_data_file = os.path.join(manga_save_path, 'fave.json')
 
+    cache_path = 'cache'
+    http_cache_path = os.path.join(cache_path, 'http')
+    http_cache_ttl = 300  # seconds a page is served without revalidating
+    http_cache_size = 64 * 1024 ** 2
+    update_chunk_size = 8 * 1024  # bytes read at a time while looking for new chapters
+    title_index_path = os.path.join(cache_path, 'titles.db')
+    thumbnail_cache_path = os.path.join(cache_path, 'thumbnails')
+    thumbnail_cache_size = 32 * 1024 ** 2
+    thumbnail_memory_items = 256  # scaled covers kept in memory
+    title_suggestions = 10
+
     html_index = 'index.html'
 
     css_folder = os.path.join(web_files_location, 'css')
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import threading
+import time
+
+from modules.settings import Settings
+
+
+class ThumbnailCache(object):
+    """
+    On disk cache of cover images
+
+    Images are stored once under the sha1 of their bytes and the index maps urls to them,
+    so a cover served from several urls is kept once. Covers are not revalidated, they are
+    evicted least recently used first once they pass (max_bytes)
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        self.path = path if path is not None else Settings.thumbnail_cache_path
+        self.max_bytes = max_bytes if max_bytes is not None else Settings.thumbnail_cache_size
+
+        self._lock = threading.Lock()
+        self._index = None  # url: {'hash', 'size', 'accessed'}
+        self._dirty = False  # access times not saved yet
+
+    def load(self, url: str):
+        """ returns (bytes): the cover of (url) or None if it is not cached """
+        with self._lock:
+            entry = self._entries().get(url)
+            if entry is None:
+                return None
+            entry['accessed'] = time.time()
+            self._dirty = True
+            digest = entry['hash']
+
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._entries().pop(url, None)
+            return None
+
+    def touch(self, url: str) -> None:
+        """ Marks the cover of (url) used without reading it, for covers the ui still holds """
+        with self._lock:
+            entry = self._entries().get(url)
+            if entry is not None:
+                entry['accessed'] = time.time()
+                self._dirty = True
+
+    def flush(self) -> None:
+        """ Saves access times of covers that were loaded or touched since the last save """
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def store(self, url: str, content: bytes) -> None:
+        if len(content) > self.max_bytes:
+            return
+
+        digest = hashlib.sha1(content).hexdigest()
+
+        with self._lock:
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(content)
+                os.replace(path + '.tmp', path)
+
+            previous = self._entries().get(url)
+            self._entries()[url] = {'hash': digest, 'size': len(content), 'accessed': time.time()}
+            if previous is not None and previous['hash'] != digest:
+                self._release(previous['hash'])
+
+            self._evict()
+            self._save_index()
+
+    def _evict(self) -> None:
+        entries = self._entries()
+
+        # objects are shared, each is counted once and lives as long as its latest used url
+        objects = {}
+        for url, entry in entries.items():
+            accessed, size = objects.get(entry['hash'], (0, entry['size']))
+            objects[entry['hash']] = (max(accessed, entry['accessed']), size)
+
+        total = sum(size for _, size in objects.values())
+        for digest in sorted(objects, key=lambda d: objects[d][0]):
+            if total <= self.max_bytes:
+                break
+            total -= objects[digest][1]
+            for url in [url for url, entry in entries.items() if entry['hash'] == digest]:
+                del entries[url]
+            self._remove_object(digest)
+
+    def _release(self, digest: str) -> None:
+        """ Removes object (digest) once no url refers to it """
+        if all(entry['hash'] != digest for entry in self._entries().values()):
+            self._remove_object(digest)
+
+    def _remove_object(self, digest: str) -> None:
+        try:
+            os.remove(self._object_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.path, 'objects', digest[:2], digest)
+
+    def _entries(self) -> dict:
+        """ Index of the cache, loaded on first use, call with the lock held """
+        if self._index is None:
+            try:
+                with open(os.path.join(self.path, 'index.json'), 'r') as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        self._dirty = False
+        os.makedirs(self.path, exist_ok=True)
+
+        index_path = os.path.join(self.path, 'index.json')
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(self._index, f)
+        os.replace(index_path + '.tmp', index_path)
+
+
+default_thumbnails = ThumbnailCache()
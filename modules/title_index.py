@@ -0,0 +1,155 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from modules.settings import Settings
+
+
+class TitleIndex(object):
+    """
+    Local index of every manga title the app has seen, for suggestions without a request
+
+    Titles come from search results, popular pages, top 10, favourites and the downloaded library.
+    Stored in sqlite, matched by word prefix through FTS5 or by substring where FTS5 is not compiled in
+    """
+
+    def __init__(self, path: str = None):
+        """
+        path (str): sqlite database, created on first use
+        """
+        self.path = path if path is not None else Settings.title_index_path
+
+        self._lock = threading.Lock()
+        self._connection = None
+        self.fts = False
+
+    def add(self, entries: list, source: str) -> None:
+        """
+        entries (list): [{'title', 'url', 'last_chapter'}], url and last_chapter may be missing
+        source (str): where the titles were seen, 'search', 'popular', 'top10', 'favourite' or 'library'
+        """
+        rows = []
+        seen = time.time()
+        for entry in entries:
+            title = entry['title'].strip()
+            if title == '':
+                continue
+
+            url = entry.get('url')
+            key = url if url is not None else source + ':' + title.lower()
+            rows.append((key, title, url, entry.get('last_chapter'), source, seen))
+
+        if len(rows) == 0:
+            return
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    'INSERT INTO titles (key, title, url, last_chapter, source, seen) VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET title = excluded.title, '
+                    'last_chapter = COALESCE(excluded.last_chapter, titles.last_chapter), '
+                    'source = excluded.source, seen = excluded.seen', rows)
+
+    def add_library(self, path: str = None) -> None:
+        """
+        path (str): directory of downloaded mangas, Settings.manga_save_path if None
+
+        Replaces the library titles with the manga directories in (path)
+        """
+        path = path if path is not None else Settings.manga_save_path
+        try:
+            names = [name for name in os.listdir(path)
+                     if os.path.isdir(os.path.join(path, name)) and name != Settings.download_jobs_path]
+        except FileNotFoundError:
+            names = []
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM titles WHERE source = 'library'")
+
+        self.add([{'title': name} for name in names], 'library')
+
+    def suggest(self, text: str, limit: int = None) -> list:
+        """
+        text (str): what has been typed so far
+        limit (int): most suggestions returned, Settings.title_suggestions if None
+
+        returns (list): [{'title', 'url', 'last_chapter', 'source'}] titles starting with (text) first,
+                        then by relevance, one per title
+        """
+        limit = limit if limit is not None else Settings.title_suggestions
+        words = re.findall(r'\w+', text.lower())
+        if len(words) == 0:
+            return []
+
+        with self._lock:
+            connection = self._connect()
+            if self.fts:
+                rows = connection.execute(
+                    'SELECT titles.title, titles.url, titles.last_chapter, titles.source FROM titles_fts '
+                    'JOIN titles ON titles.rowid = titles_fts.rowid WHERE titles_fts MATCH ? '
+                    'ORDER BY titles.title LIKE ? DESC, titles_fts.rank, titles.seen DESC LIMIT ?',
+                    (' '.join('"' + word + '"*' for word in words), text.strip() + '%', limit * 2)).fetchall()
+            else:
+                rows = connection.execute(
+                    'SELECT title, url, last_chapter, source FROM titles WHERE ' +
+                    ' AND '.join('title LIKE ?' for _ in words) +
+                    ' ORDER BY title LIKE ? DESC, seen DESC LIMIT ?',
+                    ['%' + word + '%' for word in words] + [text.strip() + '%', limit * 2]).fetchall()
+
+        # a downloaded manga is often also seen online, the entry with a url wins
+        suggestions = {}
+        for title, url, last_chapter, source in rows:
+            known = suggestions.get(title.lower())
+            if known is None or (known['url'] is None and url is not None):
+                suggestions[title.lower()] = {'title': title, 'url': url, 'last_chapter': last_chapter,
+                                              'source': source}
+
+        return list(suggestions.values())[:limit]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM titles').fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Opens the database on first use, call with the lock held """
+        if self._connection is not None:
+            return self._connection
+
+        directory = os.path.dirname(self.path)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute('CREATE TABLE IF NOT EXISTS titles (key TEXT PRIMARY KEY, title TEXT NOT NULL, '
+                           'url TEXT, last_chapter TEXT, source TEXT, seen REAL)')
+
+        created = connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'titles_fts'").fetchone()[0] == 0
+        try:
+            with connection:
+                connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS titles_fts USING '
+                                   "fts5(title, content='titles', content_rowid='rowid')")
+                connection.execute('CREATE TRIGGER IF NOT EXISTS titles_ai AFTER INSERT ON titles BEGIN '
+                                   'INSERT INTO titles_fts (rowid, title) VALUES (new.rowid, new.title); END')
+                connection.execute('CREATE TRIGGER IF NOT EXISTS titles_ad AFTER DELETE ON titles BEGIN '
+                                   "INSERT INTO titles_fts (titles_fts, rowid, title) VALUES ('delete', old.rowid, old.title); END")
+                connection.execute('CREATE TRIGGER IF NOT EXISTS titles_au AFTER UPDATE ON titles BEGIN '
+                                   "INSERT INTO titles_fts (titles_fts, rowid, title) VALUES ('delete', old.rowid, old.title); "
+                                   'INSERT INTO titles_fts (rowid, title) VALUES (new.rowid, new.title); END')
+                if created:
+                    # titles stored while fts5 was missing
+                    connection.execute("INSERT INTO titles_fts (titles_fts) VALUES ('rebuild')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            # sqlite built without fts5, suggestions fall back to substring matches
+            self.fts = False
+
+        self._connection = connection
+        return connection
+
+
+default_index = TitleIndex()
@@ -0,0 +1,115 @@
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from modules.chapterList import ChapterListDownloader
+from modules.favourite import Favourite
+from modules.favourite_store import default_store
+from modules.settings import Settings
+from modules.title_index import default_index
+from modules.update_results import UpdateResults
+
+logger = logging.getLogger('mangak.daemon')
+
+
+class UpdateDaemon(object):
+    """
+    Checks favourites for new chapters on a schedule without a ui
+
+    Every check is written to UpdateResults for the ui to show at startup.
+    With auto_download new chapters are downloaded and become the favourites last chapter
+    """
+
+    def __init__(self, settings: Settings, interval: float = None, jitter: float = None, auto_download: bool = False):
+        """
+        settings (Settings): user settings, compositing options of auto downloads are taken from it
+        interval (float): seconds between checks
+        jitter (float): fraction of the interval every wait is randomly moved by
+        """
+        self.settings = settings
+        self.interval = interval if interval is not None else Settings.daemon_interval
+        self.jitter = jitter if jitter is not None else Settings.daemon_jitter
+        self.auto_download = auto_download
+
+        self.results = UpdateResults()
+        self.stopping = threading.Event()
+        self.downloader = None
+
+    def run(self) -> None:
+        """ Checks until stopped """
+        while not self.stopping.is_set():
+            try:
+                self.check()
+            except Exception:
+                logger.exception('update check failed')
+
+            self.stopping.wait(self.next_delay())
+
+    def stop(self) -> None:
+        self.stopping.set()
+        if self.downloader is not None:
+            self.downloader.stop()
+
+    def next_delay(self) -> float:
+        """ returns (float): seconds until the next check, jittered so many clients do not poll in step """
+        return max(0.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def check(self) -> list:
+        """
+        returns (list): rows of Favourite.check for every favourite
+
+        Favourites are checked a few at a time, the host limiters bound how many hit one host at once
+        """
+        favourites = default_store.all()
+
+        results = []
+        with ThreadPoolExecutor(max_workers=Settings.favourite_workers) as executor:
+            futures = [executor.submit(Favourite.check, favourite) for favourite in favourites]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+        self.results.save(results)
+        default_index.add([{'title': result['title'], 'url': result['url']}
+                           for result in results if result['status'] != 'Failed'], 'favourite')
+
+        updated = [result for result in results if result['updates'] > 0]
+        logger.info('checked %d favourites, %d with new chapters', len(results), len(updated))
+        for result in updated:
+            logger.info('%s: %d new chapters', result['title'], result['updates'])
+
+        if self.auto_download:
+            for result in updated:
+                if self.stopping.is_set():
+                    break
+                self.download(result)
+
+        return results
+
+    def download(self, result: dict) -> bool:
+        """
+        result (dict): row of Favourite.check with new chapters
+
+        returns (bool): True if every new chapter was downloaded
+        """
+        downloader = ChapterListDownloader()
+        downloader.manga_name = ChapterListDownloader.safe_name(result['title'])
+        downloader.compile_jpg = self.settings.settings['composite_jpg']
+        downloader.compile_pdf = self.settings.settings['composite_pdf']
+        downloader.keep_originals = self.settings.settings['keep_originals']
+
+        # new chapters are listed newest first, downloads go oldest first
+        # a download that was interrupted continues where it stopped
+        downloader.resume('daemon', result['url'], list(reversed(result['chapters'])))
+        downloader.connect_composition(lambda text: logger.info('%s: %s', result['title'], text))
+
+        logger.info('downloading %d chapters of %s', len(downloader.chapter_list), result['title'])
+        self.downloader = downloader
+        try:
+            completed = downloader.download()
+        finally:
+            self.downloader = None
+
+        if completed:
+            default_store.add(result['url'], result['chapters'][0])
+        return completed
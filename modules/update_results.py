@@ -0,0 +1,33 @@
+import os
+import json
+import time
+
+from modules.settings import Settings
+
+
+class UpdateResults(object):
+    """
+    Last favourites update check, written by the update daemon and the ui refresh
+
+    The ui fills the favourites table from it at startup without waiting on the network
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path if path is not None else os.path.join(Settings.manga_save_path, Settings.update_results_file)
+
+    def save(self, results: list) -> None:
+        """ results (list): rows of Favourite.check """
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'checked': time.time(), 'results': results}, f)
+        os.replace(temp, self.path)
+
+    def load(self) -> tuple:
+        """ returns (tuple): (checked, results), checked is None if nothing was saved yet """
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None, []
+
+        return data['checked'], data['results']
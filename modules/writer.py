@@ -0,0 +1,121 @@
+import os
+import queue
+import threading
+
+from requests.exceptions import ConnectionError
+from urllib3.exceptions import HTTPError
+
+from modules.settings import Settings
+
+
+class IncompleteBody(ConnectionError):
+    """ The response arrived but its body was cut off, the partial file can be resumed """
+
+
+class StreamWriter(object):
+    """
+    Writes a streamed response to (path) from a dedicated writer thread
+
+    The socket is read with readinto into a small pool of reused fixed size buffers that are handed
+    to the writer through a bounded queue, so a slow disk never stalls socket reads until the pool runs dry
+    """
+
+    def __init__(self, path: str, offset: int = 0, size: int = None):
+        """
+        path (str): file to write to
+        offset (int): bytes already in the file to keep, writing continues after them
+        size (int): expected final size of the file, space is preallocated when known
+        """
+        self.path = path
+        self.offset = offset
+        self.size = size
+
+        self.buffer_size = Settings.stream_buffer_size
+        self.buffers = Settings.stream_buffers
+
+    def write(self, response, on_received=None) -> int:
+        """
+        response (Response): response requested with stream=True
+        on_received (callable): called with the amount of bytes of every read
+
+        returns (int): size of the file once written
+        """
+        free = queue.Queue()
+        for _ in range(self.buffers):
+            free.put(bytearray(self.buffer_size))
+        filled = queue.Queue(maxsize=self.buffers)
+
+        # unbuffered, so every byte counted as stored is in the file
+        with open(self.path, 'r+b' if self.offset > 0 else 'wb', buffering=0) as f:
+            f.truncate(self.offset)
+            self._preallocate(f)
+            f.seek(self.offset)
+
+            errors = []
+            stored = [self.offset]
+            writer = threading.Thread(target=self._write_buffers, args=(f, free, filled, errors, stored), daemon=True)
+            writer.start()
+
+            written = self.offset
+            raw = response.raw
+            raw.decode_content = True
+            try:
+                while not errors:
+                    buffer = free.get()
+                    try:
+                        length = raw.readinto(buffer)
+                    except HTTPError as e:
+                        free.put(buffer)
+                        raise IncompleteBody(e)
+
+                    if not length:
+                        free.put(buffer)
+                        break
+
+                    filled.put((buffer, length))
+                    written += length
+                    if on_received is not None:
+                        on_received(length)
+            finally:
+                filled.put(None)
+                writer.join()
+
+                # drop preallocated space and anything after a failed write, a resume continues from here
+                f.truncate(stored[0])
+
+            if errors:
+                raise errors[0]
+
+        return stored[0]
+
+    def _preallocate(self, f) -> None:
+        if self.size is None or self.size <= self.offset:
+            return
+
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(f.fileno(), self.offset, self.size - self.offset)
+            except OSError:
+                pass  # file system without support, the file grows as it is written
+
+    @staticmethod
+    def _write_buffers(f, free: queue.Queue, filled: queue.Queue, errors: list, stored: list) -> None:
+        """ Writes filled buffers in order, stored[0] is the size of the file written so far """
+        while True:
+            item = filled.get()
+            if item is None:
+                return
+            if errors:
+                continue  # keep draining so the reader never blocks
+
+            buffer, length = item
+            try:
+                view = memoryview(buffer)[:length]
+                while len(view) > 0:
+                    amount = f.write(view)
+                    stored[0] += amount
+                    view = view[amount:]
+            except OSError as e:
+                errors.append(e)
+            finally:
+                free.put(buffer)
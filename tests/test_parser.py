@@ -0,0 +1,132 @@
+"""
+Extraction through modules.parser must match a full html.parser parse of the same page
+
+The fixtures are saved mangakakalot pages with the tricky parts kept:
+tags inside scripts, styles and comments, nested containers and escaped text
+"""
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from modules import parser
+from modules.settings import Settings
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name + '.html'), 'rb') as f:
+        return f.read()
+
+
+def old_find(content: bytes, name: str = None, attrs: dict = None):
+    return BeautifulSoup(content, 'html.parser').find(name, attrs)
+
+
+def old_find_all(content: bytes, name: str = None, attrs: dict = None):
+    return BeautifulSoup(content, 'html.parser').find_all(name, attrs)
+
+
+def new_find_all(content: bytes, name: str = None, attrs: dict = None):
+    return parser.parse(content, name, attrs).find_all(name, attrs)
+
+
+# what the loaders read from every page, given a find and a find_all
+def manga_title(content, find, find_all):
+    return find(content, attrs={'class': 'manga-info-text'}).find('h1').text
+
+
+def manga_chapters(content, find, find_all):
+    rows = find(content, attrs={'class': 'chapter-list'}).find_all(class_='row')
+    return [(row.find('a', href=True).text, row.find('a', href=True)['href']) for row in rows]
+
+
+def chapter_pages(content, find, find_all):
+    return [img['src'] for img in find(content, attrs={'id': 'vungdoc'}).find_all('img')]
+
+
+def page_numbers(content, find, find_all):
+    return [(a.text, a.get('href')) for a in find(content, 'div', {'class': 'group_page'}).find_all('a')]
+
+
+def search_results(content, find, find_all):
+    dish = find(content, 'div', {'class': 'panel_story_list'})
+    return [(result.find('h3', {'class': 'story_name'}).text.strip('\n'),
+             result.find_all('em', {'class': 'story_chapter'})[0].text.strip('\n'),
+             result.find('a')['href'])
+            for result in dish.find_all('div', {'class': 'story_item'})]
+
+
+def popular_cards(content, find, find_all):
+    return [(card.find_all('a')[0].find('img')['src'],
+             card.find_all('a')[0]['href'],
+             card.find('h3').text.strip('\n'),
+             card.find('a', {'class': 'list-story-item-wrap-chapter'}).text.strip('\n'),
+             card.find('span', {'class': 'aye_icon'}).text.strip('\n'),
+             card.find('p').text.strip('\n'))
+            for card in find_all(content, 'div', {'class': 'list-truyen-item-wrap'})]
+
+
+def top10(content, find, find_all):
+    return [(block.find('a')['href'], block.find('a')['title'].strip('\n'),
+             block.find('a').text.strip('\n').split('-')[-1][1:])
+            for block in find_all(content, 'div', {'class': 'xem-nhieu-item'})]
+
+
+EXTRACTIONS = [
+    ('manga', manga_title),
+    ('manga', manga_chapters),
+    ('chapter', chapter_pages),
+    ('search', page_numbers),
+    ('search', search_results),
+    ('popular', page_numbers),
+    ('popular', popular_cards),
+    ('home', top10),
+]
+
+
+@pytest.fixture(params=['lxml', 'html.parser'])
+def backend(request, monkeypatch):
+    monkeypatch.setattr(Settings, 'html_parser', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('page, extract', EXTRACTIONS, ids=lambda value: getattr(value, '__name__', value))
+def test_extraction_matches_html_parser(backend, page, extract):
+    content = fixture(page)
+
+    expected = extract(content, old_find, old_find_all)
+    assert len(expected) > 0
+    assert extract(content, parser.find, new_find_all) == expected
+
+
+@pytest.mark.parametrize('page, attrs', [
+    ('manga', {'class': 'manga-info-text'}),
+    ('manga', {'class': 'chapter-list'}),
+    ('chapter', {'id': 'vungdoc'}),
+    ('search', {'class': 'panel_story_list'}),
+    ('search', {'class': 'group_page'}),
+])
+@pytest.mark.parametrize('chunk_size', [1, 7, 512, 8 * 1024])
+def test_slicer_fed_in_pieces(page, attrs, chunk_size):
+    content = fixture(page)
+
+    slicer = parser.ElementSlicer(attrs=attrs)
+    for i in range(0, len(content), chunk_size):
+        if slicer.feed(content[i:i + chunk_size]):
+            break
+
+    assert slicer.done
+    assert slicer.element() == parser.slice_element(content, attrs=attrs)
+
+    sliced = BeautifulSoup(slicer.element(), 'html.parser').find(attrs=attrs)
+    assert str(sliced) == str(old_find(content, attrs=attrs))
+
+
+def test_containers_in_scripts_and_comments_are_skipped():
+    content = fixture('manga')
+
+    # the head script holds a chapter-list and the body a commented out manga-info-text
+    assert parser.slice_element(content, attrs={'class': 'chapter-list'}).count(b'class="row"') == 48
+    assert b'Commented out' not in parser.slice_element(content, attrs={'class': 'manga-info-text'})
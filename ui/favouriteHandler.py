@@ -1,26 +1,37 @@
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 
+from modules.cancel import CancelToken
 from modules.favourite import Favourite
-from modules.jar import j_call
+from modules.favourite_store import default_store
 from modules.settings import Settings
 from modules.internet import have_internet
+from modules.update_results import UpdateResults
 
 
 class FavouriteHandler(object):
     def __init__(self):
         super(FavouriteHandler, self).__init__()
 
+        self.favourite_store = default_store
+        self.favourite_store.migrate()
+
         self.favourite_handle = Favourite()
         self.favourite_thread = QThread()
+        self.favourite_rows = []  # loaded favourites in table order
 
         self.favourite_handle.on_progress.connect(self.on_favourite_progress)
         self.favourite_handle.on_maximum.connect(self.on_favourite_maximum)
+        self.favourite_handle.on_loaded.connect(self.on_favourite_row_loaded)
 
         self.favourite_handle.moveToThread(self.favourite_thread)
 
         self.favourite_handle.finished.connect(self.on_favourite_loaded)
         self.favourite_thread.started.connect(self.favourite_handle.load)
+        self.favourite_thread.finished.connect(self.on_favourite_thread_finished)
+
+        # a refresh asked for while one was running
+        self.favourite_pending = False
 
     def on_favourite_progress(self, i):
         self.favourite['progress'].setValue(i)
@@ -34,9 +45,23 @@ class FavouriteHandler(object):
         if not have_internet():
             return
 
+        if self.favourite_thread.isRunning():
+            # favourites changed since the running check started, it is aborted and checked again
+            self.favourite_pending = True
+            self.favourite_handle.token.cancel()
+            return
+
         self.set_favourite_controls(False)
+        self.favourite_rows = []
+        self.favourite['table'].setRowCount(0)
+        self.favourite_handle.token = CancelToken()
         self.favourite_thread.start()
 
+    def on_favourite_thread_finished(self):
+        if self.favourite_pending:
+            self.favourite_pending = False
+            self.on_favourite_refresh()
+
     def on_favourite_delete(self):
         indexes = self.favourite['table'].selectedIndexes()
         if len(indexes) <= 0:
@@ -46,13 +71,15 @@ class FavouriteHandler(object):
         links = set()
         for index in indexes:
             rows.add(index.row())
-            links.add(self.favourite_handle.loaded[index.row()]['url'])
+            links.add(self.favourite_rows[index.row()]['url'])
 
-        j_call(file=Settings.kfave_path, args=[Settings.favourite_data_file, 'remove'] + list(links))
+        self.favourite_store.remove(*links)
 
-        rows = list(rows)
+        rows = sorted(rows)
         while len(rows) > 0:
-            self.favourite['table'].removeRow(rows.pop(-1))
+            row = rows.pop(-1)
+            self.favourite['table'].removeRow(row)
+            del self.favourite_rows[row]
 
     def on_favourite_go(self):
         indexes = self.favourite['table'].selectedIndexes()
@@ -60,35 +87,52 @@ class FavouriteHandler(object):
             return
 
         self.search['next_button'].setEnabled(False)
-        self.load_manga(self.favourite_handle.loaded[indexes[0].row()]['url'])
+        self.load_manga(self.favourite_rows[indexes[0].row()]['url'])
 
     def on_favourite_double_click(self, i):
         if not self.favourite['go'].isEnabled():
             return
 
         self.search['next_button'].setEnabled(False)
-        self.load_manga(self.favourite_handle.loaded[i.row()]['url'])
+        self.load_manga(self.favourite_rows[i.row()]['url'])
 
-    def on_favourite_loaded(self):
-        self.favourite_thread.quit()
-        self.favourite['progress'].hide()
+    def on_favourite_row_loaded(self, data_piece: dict):
+        # favourites with updates go above the rest, in the order they were found
+        if data_piece['updates'] > 0:
+            i = len([row for row in self.favourite_rows if row['updates'] > 0])
+        else:
+            i = len(self.favourite_rows)
+        self.favourite_rows.insert(i, data_piece)
+
+        name = QTableWidgetItem(data_piece['title'])
+        name.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
 
-        self.favourite['table'].setRowCount(len(self.favourite_handle.loaded))
-        for i in range(len(self.favourite_handle.loaded)):
-            data_piece = self.favourite_handle.loaded[i]
+        status = QTableWidgetItem(data_piece['status'])
+        status.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
 
-            name = QTableWidgetItem(data_piece['title'])
-            name.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
+        last = QTableWidgetItem(data_piece['chapter'])
+        last.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
 
-            status = QTableWidgetItem(data_piece['status'])
-            status.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
+        self.favourite['table'].insertRow(i)
+        self.favourite['table'].setItem(i, 0, name)
+        self.favourite['table'].setItem(i, 1, status)
+        self.favourite['table'].setItem(i, 2, last)
+
+    def load_favourite_results(self):
+        checked, results = UpdateResults().load()
+        if checked is None:
+            return
 
-            last = QTableWidgetItem(data_piece['chapter'])
-            last.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
+        self.favourite_rows = []
+        self.favourite['table'].setRowCount(0)
+        for data_piece in results:
+            # favourites deleted since the check are still in the saved results
+            if data_piece['url'] in self.favourite_store:
+                self.on_favourite_row_loaded(data_piece)
 
-            self.favourite['table'].setItem(i, 0, name)
-            self.favourite['table'].setItem(i, 1, status)
-            self.favourite['table'].setItem(i, 2, last)
+    def on_favourite_loaded(self):
+        self.favourite_thread.quit()
+        self.favourite['progress'].hide()
 
         self.set_favourite_controls(True)
 
@@ -1,14 +1,14 @@
 
 import os
-import json
-import re
 
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 
 from modules.chapterList import ChapterListDownloader
+from modules.download_queue import DownloadQueue
 from modules.internet import have_internet
+from modules.journal import DownloadJournal
 from modules.settings import Settings
 
 class ThreadedMangaDownload(object):
@@ -16,52 +16,118 @@ class ThreadedMangaDownload(object):
         super().__init__()
         self.path = None
 
-        self.downloader = ChapterListDownloader()
-        self.downloader_thread = QThread()
-        self.init_downloader_thread()
-    
-    def start_download_task(self, manga_title: str, chapter_list : list):
+        self.downloader = None  # downloader shown in the progress bars
+        self.shown_job = None
+
+        self.download_queue = DownloadQueue()
+        self.download_queue_thread = QThread()
+        self.init_download_queue_thread()
+
+        # progress is polled from the shown downloader instead of signalled by its workers
+        self.download_progress_timer = QTimer()
+        self.download_progress_timer.setInterval(int(1000 / Settings.progress_rate))
+        self.download_progress_timer.timeout.connect(self.on_download_progress_tick)
+
+    def start_download_task(self, manga_title: str, chapter_list : list, priority: int = 0):
         if not have_internet():
             return
 
-        manga_title = re.sub(r'[/\\:*"<>|\?]', '', manga_title)
-        self.path = os.path.realpath(os.path.join(Settings.manga_save_path, manga_title))
+        manga_title = ChapterListDownloader.safe_name(manga_title)
         self.progress['composite_label'].setText('')
         self.progress['chapter_list'].hide()
         self.progress['open_button'].hide()
         self.stack.setCurrentIndex(3)
 
-        self.downloader.manga_name = manga_title
-        self.progress['title_label'].setText(manga_title)
+        self.download_queue.add(manga_title, chapter_list, priority=priority,
+                                compile_jpg=self.settings.settings['composite_jpg'],
+                                compile_pdf=self.settings.settings['composite_pdf'],
+                                keep_originals=self.settings.settings['keep_originals'])
+        self.download['download_button'].setEnabled(True)
+
+        self.start_download_queue()
+
+    def start_download_queue(self):
+        if not self.download_queue_thread.isRunning():
+            self.download_queue_thread.start()
+
+    def init_download_queue_thread(self):
+        self.download_queue.moveToThread(self.download_queue_thread)
+
+        # blocking so the bars are connected before the job emits anything
+        self.download_queue.job_started.connect(self.on_job_started, Qt.BlockingQueuedConnection)
+        self.download_queue.job_finished.connect(self.on_job_finished)
+        self.download_queue.changed.connect(self.refresh_download_queue)
 
-        self.downloader.chapter_list = chapter_list
-        self.downloader.compile_jpg = self.settings.settings['composite_jpg']
-        self.downloader.compile_pdf = self.settings.settings['composite_pdf']
-        self.downloader.keep_originals = self.settings.settings['keep_originals']
+        self.download_queue.finished.connect(self.on_download_queue_finished)
 
-        self.downloader_thread.start()
+        self.download_queue_thread.started.connect(self.download_queue.run)
 
-    def init_downloader_thread(self):
-        self.downloader.total_title_changed.connect(lambda text: self.progress['total_label'].setText(text))
-        self.downloader.total_maximum_changed.connect(lambda i: self.progress['total_progress'].setMaximum(i))
-        self.downloader.total_progress_changed.connect(lambda i: self.progress['total_progress'].setValue(i))
+    def on_job_started(self, job_id: str, downloader):
+        if self.downloader is not None:
+            self.disconnect_downloader(self.downloader)
 
-        self.downloader.chapter_title_changed.connect(lambda text: self.progress['chapter_label'].setText(text))
-        self.downloader.chapter_maximum_changed.connect(lambda i: self.progress['chapter_progress'].setMaximum(i))
-        self.downloader.chapter_progress_changed.connect(lambda i: self.progress['chapter_progress'].setValue(i))
-        
-        self.downloader.page_title_changed.connect(lambda text: self.progress['page_label'].setText(text))
-        self.downloader.page_maximum_changed.connect(lambda i: self.progress['page_progress'].setMaximum(i / 1024))
-        self.downloader.page_progress_changed.connect(lambda i: self.progress['page_progress'].setValue(i / 1024))
+        self.downloader = downloader
+        self.shown_job = job_id
+        self.path = os.path.realpath(os.path.join(Settings.manga_save_path, downloader.manga_name))
+        self.progress['title_label'].setText(downloader.manga_name)
+        self.progress['composite_label'].setText('')
+        self.progress['chapter_list'].hide()
+        self.progress['open_button'].hide()
+
+        downloader.composition_label_changed.connect(lambda text: self.progress['composite_label'].setText(text))
+        downloader.limits_changed.connect(self.on_limits_changed)
+
+        self.download_progress_timer.start()
+
+    def disconnect_downloader(self, downloader):
+        for signal in (downloader.composition_label_changed, downloader.limits_changed):
+            try:
+                signal.disconnect()
+            except TypeError:
+                pass  # nothing connected
+
+    def on_download_progress_tick(self):
+        if self.downloader is None:
+            return
 
-        self.downloader.composition_label_changed.connect(lambda text: self.progress['composite_label'].setText(text))
+        snapshot = self.downloader.progress.snapshot()
 
-        self.downloader.moveToThread(self.downloader_thread)
+        self.progress['total_progress'].setMaximum(snapshot['total'][1])
+        self.progress['total_progress'].setValue(snapshot['total'][0])
+        self.progress['total_label'].setText(self.format_rate(snapshot['speed'], snapshot['eta']))
 
-        self.downloader.finished.connect(self.downloader_thread.exit)
-        self.downloader.finished.connect(self.on_download_finished)
+        self.progress['chapter_label'].setText(snapshot['chapter_title'])
+        self.progress['chapter_progress'].setMaximum(snapshot['chapter'][1])
+        self.progress['chapter_progress'].setValue(snapshot['chapter'][0])
 
-        self.downloader_thread.started.connect(self.downloader.download)
+        self.progress['page_label'].setText(snapshot['page_title'])
+        self.progress['page_progress'].setMaximum(snapshot['page'][1] // 1024)
+        self.progress['page_progress'].setValue(snapshot['page'][0] // 1024)
+
+    @staticmethod
+    def format_rate(speed: float, eta) -> str:
+        text = '{:.1f} KB/s'.format(speed / 1024) if speed < 1024 ** 2 else '{:.1f} MB/s'.format(speed / 1024 ** 2)
+        if eta is None:
+            return text
+
+        minutes, seconds = divmod(int(eta), 60)
+        hours, minutes = divmod(minutes, 60)
+        if hours > 0:
+            return '{}, {}h {}m left'.format(text, hours, minutes)
+        return '{}, {}m {}s left'.format(text, minutes, seconds)
+
+    def on_job_finished(self, job_id: str, completed: bool):
+        if job_id != self.shown_job:
+            return
+
+        self.on_download_progress_tick()
+        self.download_progress_timer.stop()
+
+        if completed:
+            self.on_download_finished()
+        else:
+            self.progress['composite_label'].setText('Download Task Stopped')
+            self.progress['chapter_list'].show()
 
     def on_download_finished(self):
         self.progress['total_progress'].setValue(self.progress['total_progress'].maximum())
@@ -73,32 +139,93 @@ class ThreadedMangaDownload(object):
         self.progress['chapter_list'].show()
         self.progress['open_button'].show()
 
-    def download_resume_init(self):
-        if not os.path.exists(os.path.join(Settings.manga_save_path, Settings.download_log)):
+    def on_download_queue_finished(self):
+        self.download_queue_thread.exit()
+        self.download_queue_thread.wait()
+
+        # a job added while the queue was winding down
+        if self.download_queue.pending() > 0:
+            self.start_download_queue()
+
+    def refresh_download_queue(self):
+        self.progress['queue'].clear()
+        for job in self.download_queue.jobs[:]:
+            item = QListWidgetItem('[{}] {} - {} {} (priority {})'.format(
+                job['state'], job['name'], len(job['list']), 'chapter' if len(job['list']) == 1 else 'chapters',
+                job['priority']))
+            item.setData(Qt.UserRole, job['id'])
+            self.progress['queue'].addItem(item)
+
+    def on_download_queue_menu(self, position: QPoint):
+        item = self.progress['queue'].itemAt(position)
+        if item is None:
             return
 
-        manga_title = None
-        chapter_list = None
-        with open(os.path.join(Settings.manga_save_path, Settings.download_log)) as dlog:
-            data = json.load(dlog)
-            manga_title = data['name']
-            chapter_list = data['list']
-
-        final_list = []
-        if type(chapter_list) == dict:
-            final_list.append(chapter_list)
-        elif type(chapter_list) == list:
-            final_list = chapter_list
-        else:
-            os.remove(os.path.join(Settings.manga_save_path, Settings.download_log))
+        job = self.download_queue.get(item.data(Qt.UserRole))
+        if job is None:
             return
 
-        resume_query = QMessageBox.question(self, manga_title, 'Download of {0} {1} was not completed.\nWould you like to resume?'.format(len(final_list), 'chapter' if len(final_list) == 1 else 'chapters'))
+        menu = QMenu(self)
+        pause = menu.addAction('Resume' if job['state'] == 'paused' else 'Pause')
+        up = menu.addAction('Move up')
+        down = menu.addAction('Move down')
+        raise_priority = menu.addAction('Raise priority')
+        lower_priority = menu.addAction('Lower priority')
+        menu.addSeparator()
+        cancel = menu.addAction('Cancel')
+
+        action = menu.exec_(self.progress['queue'].mapToGlobal(position))
+        if action == pause:
+            if job['state'] == 'paused':
+                self.download_queue.resume(job['id'])
+                self.start_download_queue()
+            else:
+                self.download_queue.pause(job['id'])
+        elif action == up:
+            self.download_queue.move(job['id'], -1)
+        elif action == down:
+            self.download_queue.move(job['id'], 1)
+        elif action == raise_priority:
+            self.download_queue.set_priority(job['id'], job['priority'] + 1)
+        elif action == lower_priority:
+            self.download_queue.set_priority(job['id'], job['priority'] - 1)
+        elif action == cancel:
+            self.download_queue.cancel(job['id'])
+
+    def download_resume_init(self):
+        # a download log of earlier versions becomes a queued job
+        legacy = DownloadJournal()
+        state = legacy.compact()
+        if state is not None:
+            manga_title, final_list, completed_pages = state
+            job_id = self.download_queue.add(manga_title, final_list,
+                                             compile_jpg=self.settings.settings['composite_jpg'],
+                                             compile_pdf=self.settings.settings['composite_pdf'],
+                                             keep_originals=self.settings.settings['keep_originals'])
+
+            journal = self.download_queue.journal(job_id)
+            journal.start(manga_title, final_list, completed_pages)
+            journal.close()
+            legacy.remove()
+
+        self.refresh_download_queue()
+
+        pending = self.download_queue.pending()
+        if pending <= 0:
+            return
+
+        resume_query = QMessageBox.question(self, 'Downloads', 'Download of {0} {1} was not completed.\nWould you like to resume?'.format(pending, 'manga' if pending == 1 else 'mangas'))
         if resume_query == QMessageBox.Yes:
-            self.start_download_task(manga_title, final_list)
+            self.stack.setCurrentIndex(3)
+            self.start_download_queue()
         else:
-            os.remove(os.path.join(Settings.manga_save_path, Settings.download_log))
-            return
+            for job in self.download_queue.jobs[:]:
+                if job['state'] == 'queued':
+                    self.download_queue.pause(job['id'])
+
+    def on_limits_changed(self, host: str, max_in_flight: int, rate: float):
+        rate_text = 'unlimited' if rate <= 0 else '{:.1f}/s'.format(rate)
+        self.statusBar().showMessage('{}: {} in flight, {}'.format(host, max_in_flight, rate_text))
 
     def on_progress_open_clicked(self):
-        os.startfile(self.path)
\ No newline at end of file
+        os.startfile(self.path)
@@ -3,10 +3,10 @@ from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 
 import webbrowser
+from modules.cancel import CancelToken
 from modules.chapterList import ChapterListLoader
 from modules.favourite import Favourite
 from modules.internet import have_internet
-from modules.jar import fave, FaveThreaded
 
 
 class ThreadedMangaLoad(object):
@@ -19,6 +19,9 @@ class ThreadedMangaLoad(object):
         self.loader_thread = QThread()
         self.init_loader_thread()
 
+        # manga asked for while another was loading
+        self.loader_pending = None
+
     def init_loader_thread(self):
         self.loader.title.connect(self.set_title)
         self.loader.maximum.connect(self.set_manga_maximum)
@@ -32,6 +35,7 @@ class ThreadedMangaLoad(object):
         self.loader.finished.connect(self.on_manga_loaded)
 
         self.loader_thread.started.connect(self.loader.load)
+        self.loader_thread.finished.connect(self.on_loader_thread_finished)
 
     def on_valid_url(self, valid):
         if valid:
@@ -55,13 +59,28 @@ class ThreadedMangaLoad(object):
         if not have_internet():
             return
 
+        if self.loader_thread.isRunning():
+            # superseded, the running load is aborted and this one starts once it winds down
+            self.loader_pending = manga_link
+            self.loader.token.cancel()
+            return
+
         self.set_controls(False)
         
         self.loader.manga_link = manga_link
+        self.loader.token = CancelToken()
         self.loader_thread.start()
         QListWidget.item
 
+    def on_loader_thread_finished(self):
+        if self.loader_pending is not None:
+            manga_link, self.loader_pending = self.loader_pending, None
+            self.load_manga(manga_link)
+
     def on_manga_loaded(self):
+        if self.loader.token.is_cancelled():
+            return
+
         self.popular['proceed_button'].setEnabled(True)
         self.direct['next_button'].setEnabled(True)
         self.top['next_button'].setEnabled(True)
@@ -130,15 +149,12 @@ class ThreadedMangaLoad(object):
             QMessageBox.information(self, 'Updates', 'No Updates')
 
     def on_fave_this_clicked(self):
-        if self.loader.manga_link == '':
+        if self.loader.manga_link == '' or len(self.loader.loaded_list) <= 0:
             return
 
-        self.set_favourite_controls(False)
-        _fave = FaveThreaded([self.loader.manga_link])
-
-        _fave.signal.finished.connect(lambda: self.on_favourite_refresh())
-
-        QThreadPool.globalInstance().start(_fave)
+        # loaded_list is oldest first, the newest chapter becomes the last one read
+        self.favourite_store.add(self.loader.manga_link, self.loader.loaded_list[-1])
+        self.on_favourite_refresh()
 
     def on_download_clicked(self):
         self.download['download_button'].setEnabled(False)
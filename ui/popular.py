@@ -3,6 +3,7 @@ import traceback
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 
+from modules.cancel import CancelToken
 from modules.codec import PopularPageCodec
 from modules.internet import have_internet
 from widgets.list.list_extension import PopularListItem
@@ -17,6 +18,7 @@ class PopularPage(object):
 
         self.popular_codec.maximum.connect(self.on_popular_maximum)
         self.popular_codec.progress.connect(self.on_popular_progress)
+        self.popular_codec.thumbnail_loaded.connect(self.on_popular_thumbnail)
         self.popular_codec.page_updated.connect(lambda i: self.popular['page_spinbox'].setValue(i))
 
         self.popular_codec.moveToThread(self.popular_thread)
@@ -24,6 +26,10 @@ class PopularPage(object):
         self.popular_codec.finished.connect(self.on_refresh_done)
 
         self.popular_thread.started.connect(self.popular_codec.load_popular)
+        self.popular_thread.finished.connect(self.on_popular_thread_finished)
+
+        # another page was asked for while one was loading
+        self.popular_pending = False
 
     def popular_button_enabled(self, is_enabled):
         self.popular['refresh_button'].setEnabled(is_enabled)
@@ -47,10 +53,17 @@ class PopularPage(object):
         if not have_internet():
             return
 
-        self.popular_button_enabled(False)
+        if self.popular_thread.isRunning():
+            # the page loading is aborted, the current page loads once it winds down
+            self.popular_pending = True
+            self.popular_codec.token.cancel()
+            return
+
         self.popular['table'].clear()
 
         self.popular_codec.thumbnails = self.settings.settings['download_thumbnails']
+        self.popular_codec.known_thumbnails = PopularListItem.pixmaps.urls()
+        self.popular_codec.token = CancelToken()
         self.popular_thread.start()
 
     def on_refresh_done(self):
@@ -60,6 +73,11 @@ class PopularPage(object):
         self.show_popular_progress(False)
         self.popular_thread.exit()
 
+    def on_popular_thread_finished(self):
+        if self.popular_pending:
+            self.popular_pending = False
+            self.on_refresh()
+
     def on_next_page(self):
         if not have_internet():
             return
@@ -97,7 +115,10 @@ class PopularPage(object):
     def on_popular_progress(self, i, data : dict):
         # Create widget item
         item_widget = PopularListItem()
-        item_widget.setThumbnail(data['image_bytes'])
+        if self.popular_codec.thumbnails:
+            item_widget.setThumbnailPlaceholder()
+            # shown at once if it was decoded before
+            item_widget.setThumbnail(None, data['thumbnail'])
         item_widget.url = data['url']
         item_widget.setMangaTitle(data['manga_title'])
         item_widget.setLastChapter(data['last_chapter'])
@@ -113,6 +134,11 @@ class PopularPage(object):
         # update progress
         self.popular['progress'].setValue(i)
 
+    def on_popular_thumbnail(self, i, url: str, image: bytes):
+        item = self.popular['table'].item(i)
+        if item is not None:
+            self.popular['table'].itemWidget(item).setThumbnail(image, url)
+
     def _set_page(self):
         self.popular['pageno_label'].setText(f'of {self.popular_codec.max_page} pages')
 
@@ -2,8 +2,11 @@ from PyQt5 import uic
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 
+from modules.cancel import CancelToken
 from modules.codec import MKCodec
 from modules.internet import have_internet
+from modules.settings import Settings
+from modules.title_index import default_index
 
 
 class ThreadedSearch(object):
@@ -13,25 +16,87 @@ class ThreadedSearch(object):
         self.codec = MKCodec()
         self.search_thread = QThread()
         self._init_search_thread()
-        
+
+        self.title_index = default_index
+
+        # keyword waiting for the running search to wind down
+        self.search_pending = None
+
+        # search as you type once typing pauses
+        self.search_timer = QTimer()
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(Settings.search_debounce)
+        self.search_timer.timeout.connect(self._on_search_debounced)
+
     def _init_search_thread(self):
         self.codec.progress.connect(self._on_search_progress)
         self.codec.maximum.connect(self._set_search_maximum)
+        self.codec.results_added.connect(self._on_search_results_added)
 
         self.codec.moveToThread(self.search_thread)
 
         self.codec.finished.connect(self._on_search_finished)
 
         self.search_thread.started.connect(self.codec.search)
+        self.search_thread.finished.connect(self._on_search_thread_finished)
+
+    def _init_search_completer(self):
+        ''' Suggests titles from the local index while typing, no request is made '''
+        self.title_index.add_library()
+
+        completer = QCompleter(self.search['input'])
+        completer.setModel(QStringListModel(completer))
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        # the index already filtered and ordered them
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.activated[str].connect(self._on_suggestion_activated)
+
+        self.search['input'].setCompleter(completer)
+        self.search['input'].textEdited.connect(self._on_search_edited)
+
+    def _on_search_edited(self, text):
+        completer = self.search['input'].completer()
+
+        suggestions = self.title_index.suggest(text)
+        completer.model().setStringList([suggestion['title'] for suggestion in suggestions])
+
+        if len(suggestions) > 0:
+            completer.complete()
+        else:
+            completer.popup().hide()
+
+        if Settings.search_as_you_type:
+            self.search_timer.start()
+
+    def _on_suggestion_activated(self, title):
+        self.search['input'].setText(title)
+        self._search()
+
+    def _on_search_debounced(self):
+        if len(self.search['input'].text().strip()) >= 3:
+            self._search()
 
     def _search(self):
+        self.search_timer.stop()
         if not have_internet():
             return
 
-        # disable controls
-        self._set_controls(False)
+        keyword = self.codec.search_prefix + self.search['input'].text()
+        if self.search_thread.isRunning():
+            # superseded, the running search is aborted and this one starts once it winds down
+            self.search_pending = keyword
+            self.codec.token.cancel()
+            return
+
+        self._start_search(keyword)
+
+    def _start_search(self, keyword: str):
+        self.search['next_button'].setEnabled(False)
+        self.search['table'].setRowCount(0)
+        self.search['progress_bar'].hide()
 
-        self.codec.keyword = self.codec.search_prefix + self.search['input'].text()
+        self.codec.keyword = keyword
+        self.codec.token = CancelToken()
 
         self.search_thread.start()
 
@@ -49,14 +114,11 @@ class ThreadedSearch(object):
         self.search['progress_bar'].setMaximum(i)
         self.search['progress_bar'].show()
 
-    def _on_search_finished(self):
-
-        self.search_thread.quit()
-
-        # fill table
-        self.search['table'].setRowCount(len(self.codec.search_result))
-        for i in range(len(self.codec.search_result)):
-            manga = self.codec.search_result[i]
+    def _on_search_results_added(self, results: list):
+        # rows arrive a page at a time, in page order
+        for manga in results:
+            i = self.search['table'].rowCount()
+            self.search['table'].insertRow(i)
 
             name = QTableWidgetItem(manga['name'])
             name.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
@@ -67,10 +129,23 @@ class ThreadedSearch(object):
             self.search['table'].setItem(i, 0, name)
             self.search['table'].setItem(i, 1, last_chapter)
 
+    def _on_search_finished(self):
+
+        self.search_thread.quit()
+
         # enable controls
-        self._set_controls(True)
+        self.search['next_button'].setEnabled(True)
         self.search['progress_bar'].hide()
 
+        if len(self.codec.failed_pages) > 0:
+            self.statusBar().showMessage('Search pages {} could not be loaded'.format(
+                ', '.join(str(page) for page in self.codec.failed_pages)), 5000)
+
+    def _on_search_thread_finished(self):
+        if self.search_pending is not None:
+            keyword, self.search_pending = self.search_pending, None
+            self._start_search(keyword)
+
     def _search_to_manga_download(self):
         if not have_internet():
             return
@@ -78,9 +153,4 @@ class ThreadedSearch(object):
         self.search['next_button'].setEnabled(False)
         selected_index = self.search['table'].selectedIndexes()[0].row()
         self.load_manga(self.codec.search_result[selected_index]['href'])
-
-    def _set_controls(self, is_active):
-        self.search['input'].setEnabled(is_active)
-        self.search['search_button'].setEnabled(is_active)
-        self.search['next_button'].setEnabled(is_active)
     
\ No newline at end of file
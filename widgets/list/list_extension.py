@@ -4,11 +4,44 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 import PyQt5.Qt
 
+from collections import OrderedDict
+
+from modules.settings import Settings
 from widgets.list import list_item
 from widgets.list import simple_item
 import requests
 
+class PixmapCache(object):
+    """ Least recently used covers already scaled for the list, keyed by image url, ui thread only """
+
+    def __init__(self, size: int = None):
+        self.size = size if size is not None else Settings.thumbnail_memory_items
+        self._pixmaps = OrderedDict()
+
+    def get(self, url: str):
+        """ returns (QPixmap): the scaled cover of (url) or None """
+        pixmap = self._pixmaps.get(url)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(url)
+        return pixmap
+
+    def put(self, url: str, pixmap: QPixmap) -> None:
+        self._pixmaps[url] = pixmap
+        self._pixmaps.move_to_end(url)
+        while len(self._pixmaps) > self.size:
+            self._pixmaps.popitem(last=False)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._pixmaps
+
+    def urls(self) -> set:
+        return set(self._pixmaps)
+
 class PopularListItem(QWidget):
+
+    # covers are decoded and scaled once per url
+    pixmaps = PixmapCache()
+
     def __init__(self):
         super().__init__()
         list_item.Ui_Form().setupUi(self)
@@ -21,18 +54,29 @@ class PopularListItem(QWidget):
         self.viewsLabel = self.findChild(QLabel, 'viewsLabel')
         self.descriptionLabel = self.findChild(QLabel, 'descriptionLabel')
 
-    def setThumbnail(self, raw_data : bytes) -> None:
-        if raw_data == None:
-            return
+    def setThumbnail(self, raw_data : bytes, url : str = None) -> None:
+        """ raw_data (bytes): encoded cover, not needed if the cover of (url) was set before """
+        pixmap = PopularListItem.pixmaps.get(url) if url is not None else None
+        if pixmap is None:
+            if raw_data == None:
+                return
+
+            image = QImage()
+            if not image.loadFromData(raw_data):
+                return  # not an image, the placeholder stays
+
+            pixmap = QPixmap.fromImage(image).scaled(48, 81, Qt.KeepAspectRatio)
+            if url is not None:
+                PopularListItem.pixmaps.put(url, pixmap)
 
-        image = QImage()
-        image.loadFromData(raw_data)
+        self.thumbnailLabel.setPixmap(pixmap)
 
-        pixmap = QPixmap.fromImage(image)
-        
-        size = self.thumbnailLabel.sizeHint()
+    def setThumbnailPlaceholder(self) -> None:
+        ''' Holds the space of the cover until it arrives '''
+        pixmap = QPixmap(48, 72)
+        pixmap.fill(self.palette().color(QPalette.Mid))
 
-        self.thumbnailLabel.setPixmap(pixmap.scaled(48, 81, Qt.KeepAspectRatio))
+        self.thumbnailLabel.setPixmap(pixmap)
 
     def mangaTitle(self) -> str:
         return self.mangaNameLabel.text()